@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Startup time of the sshecs client
+
+Run it with `python benchmarks/startup.py` from the Client directory, it prints the results as json.
+tests/test_startup.py runs it too and fails when a threshold is exceeded.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only the menus and the connection need
+LAZY_MODULES = {
+    'help': ('requests', 'urllib3', 'simple_term_menu', 'subprocess', 'concurrent.futures'),
+    'allow': ('simple_term_menu', 'subprocess', 'concurrent.futures'),
+}
+
+# Max time (seconds) on top of the startup of a bare python interpreter
+THRESHOLDS = {
+    'import': float(os.environ.get('SSHECS_MAX_IMPORT', 0.05)),
+    'help': float(os.environ.get('SSHECS_MAX_HELP', 0.15)),
+    'allow': float(os.environ.get('SSHECS_MAX_ALLOW', 0.4)),
+}
+
+
+class AllowHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        data = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def python(args, env=None):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable] + args, cwd=CLIENT_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError('{} failed: {}'.format(' '.join(args), result.stderr))
+    return elapsed, result.stderr
+
+
+def wall_clock(args, env=None, runs=5):
+    return statistics.median(python(args, env)[0] for _ in range(runs))
+
+
+def imported_modules(args, env=None):
+    # -X importtime lines look like "import time:  self [us] | cumulative | imported package"
+    modules = {}
+    for line in python(['-X', 'importtime'] + args, env)[1].splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative) / 1000000
+    return modules
+
+
+def allow_env(home, endpoint):
+    os.makedirs(home + '/.ssh-ecs')
+    with open(home + '/.ssh-ecs/config.cfg', 'w') as fp:
+        fp.write('[Server]\nendpoint = {}/\n\n[Auth]\ntoken = token\n\n[Debug]\nmessage = False\n'.format(endpoint))
+    return dict(os.environ, HOME=home)
+
+
+def run(runs=5):
+    server = HTTPServer(('127.0.0.1', 0), AllowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            env = allow_env(home, 'http://127.0.0.1:{}'.format(server.server_address[1]))
+            help_modules = imported_modules(['-m', 'sshecs.client', '--help'])
+            allow_modules = imported_modules(['-m', 'sshecs.client', '--allow', 'id'], env)
+            results = {
+                'baseline': wall_clock(['-c', 'pass'], runs=runs),
+                'import': imported_modules(['-c', 'import sshecs.client'])['sshecs.client'],
+                'help': wall_clock(['-m', 'sshecs.client', '--help'], runs=runs),
+                'allow': wall_clock(['-m', 'sshecs.client', '--allow', 'id'], env, runs=runs),
+                'lazy_imported': sorted(
+                    [m for m in LAZY_MODULES['help'] if m in help_modules] +
+                    [m for m in LAZY_MODULES['allow'] if m in allow_modules]
+                ),
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(), indent=2))
@@ -1,22 +1,31 @@
 #!/usr/bin/env python
 
 import argparse
-import getpass
+import hashlib
 import json
 import os
 import re
-import requests
 import signal
-import shutil
-import subprocess
 import sys
 import time
 
-from simple_term_menu import TerminalMenu
+from collections import namedtuple
 from configparser import ConfigParser
 
-VERSION = 1.2
+# requests, simple_term_menu and the other heavy modules are imported where they are used,
+# so --help, --init and --allow start fast (see benchmarks/startup.py)
+
+VERSION = 1.3
 ANIMATION = '|/-\\'
+ADMIN_TIMEOUT = 300
+LONG_POLL = 25
+SESSION = None
+PREFETCH_WORKERS = 4
+PREFETCH_MAX = 20
+CACHE_DIR = os.path.expanduser('~') + '/.ssh-ecs/cache'
+CONTROL_DIR = os.path.expanduser('~') + '/.ssh-ecs'
+
+CachedResponse = namedtuple('CachedResponse', 'status_code text headers')
 
 
 def debug(message):
@@ -48,12 +57,15 @@ def init_config():
     if os.path.isfile(conf_file):
         fatal('Configuration file already exists')
 
+    import getpass
+
     token = getpass.getpass(prompt='Please enter your GitHub token : ')
 
     parser = ConfigParser()
 
     parser.add_section('Server')
     parser.set('Server', 'Endpoint', 'your-server-endpoint')
+    parser.set('Server', 'Timeout', '10')
     parser.add_section('Auth')
     parser.set('Auth', 'Token', token)
     parser.add_section('Filter')
@@ -64,6 +76,8 @@ def init_config():
     parser.add_section('SSH')
     parser.set('SSH', 'Command', 'ssh')
     parser.set('SSH', 'Options', '-o StrictHostKeyChecking=no')
+    parser.set('SSH', 'Multiplexing', 'True')
+    parser.set('SSH', 'ControlPersist', '10m')
     parser.add_section('Debug')
     parser.set('Debug', 'Message', 'False')
 
@@ -84,15 +98,82 @@ def display_path(path):
         return ''
 
 
-def ask_api(config, path, method='GET', header=False, payload=None):
-    headers = {
-        'Authorization': 'Bearer ' + config.get('Auth', 'Token')
-    }
+def api_session(config):
+    # One session for the whole process, connections to the server are kept open between calls
+    global SESSION
+    if SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retries = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+        adapter = HTTPAdapter(max_retries=retries)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Authorization': 'Bearer ' + config.get('Auth', 'Token'),
+            'Accept-Encoding': 'gzip'
+        })
+        session.endpoint = config.get('Server', 'Endpoint')
+        session.timeout = config.getfloat('Server', 'Timeout', fallback=10)
+        SESSION = session
+    return SESSION
+
+
+def cache_file(session, path):
+    key = '{}{} {}'.format(session.endpoint, path, session.headers['Authorization'])
+    return '{}/{}.json'.format(CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def cached_get(session, path, timeout):
+    # Answers are kept on disk, used as is while fresh, then revalidated with their ETag
+    from requests.structures import CaseInsensitiveDict
+
+    filename = cache_file(session, path)
+    entry = None
+    if os.path.isfile(filename):
+        try:
+            with open(filename) as fp:
+                entry = json.load(fp)
+        except ValueError:
+            entry = None
+    if entry and entry['expires'] > time.time():
+        return CachedResponse(200, entry['text'], CaseInsensitiveDict(entry['headers']))
+
+    headers = {'If-None-Match': entry['etag']} if entry else {}
+    response = session.get(session.endpoint + path, headers=headers, timeout=timeout)
+    if response.status_code == 304 and entry:
+        entry_headers = CaseInsensitiveDict(entry['headers'])
+        entry_headers.update(response.headers)
+    elif response.status_code == 200 and 'ETag' in response.headers:
+        entry = {'etag': response.headers['ETag'], 'text': response.text}
+        entry_headers = response.headers
+    else:
+        return response
+
+    # The body is stored decoded, forget the headers describing how it was sent
+    entry['headers'] = {k: v for k, v in entry_headers.items()
+                        if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+    max_age = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    entry['expires'] = time.time() + (int(max_age.group(1)) if max_age else 0)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(filename + '.tmp', 'w') as fp:
+        json.dump(entry, fp)
+    os.replace(filename + '.tmp', filename)
+    return CachedResponse(200, entry['text'], CaseInsensitiveDict(entry['headers']))
+
+
+def ask_api(config, path, method='GET', header=False, payload=None, optional=False, timeout=None, cached=False):
+    session = api_session(config)
+    timeout = (session.timeout, session.timeout + (timeout or 0))
     try:
-        if method == 'GET':
-            response = requests.get(config.get('Server', 'Endpoint') + path, headers=headers)
+        if method == 'GET' and cached:
+            response = cached_get(session, path, timeout)
+        elif method == 'GET':
+            response = session.get(session.endpoint + path, timeout=timeout)
         elif method == 'POST':
-            response = requests.post(config.get('Server', 'Endpoint') + path, json=payload, headers=headers)
+            response = session.post(session.endpoint + path, json=payload, timeout=timeout)
         else:
             raise Exception('Unhandled method ' + method)
 
@@ -111,13 +192,57 @@ def ask_api(config, path, method='GET', header=False, payload=None):
 
         return json_output
     except Exception as e:
+        if optional:
+            if config.get('Debug', 'Message') == 'True':
+                debug('Ignoring error while Querying API : {}'.format(e))
+            return None
         fatal('Error while Querying API : {}'.format(e))
 
 
-def ssh_connect(ip, container, ssh_command='ssh', ssh_options='', password=''):
+def control_path(ip):
+    return '{}/cm-ssh_bastion@{}'.format(CONTROL_DIR, ip)
+
+
+def control_persist(config):
+    # How long a master connection stays open after its last session, empty when multiplexing is disabled
+    if not config.getboolean('SSH', 'Multiplexing', fallback=True):
+        return ''
+    return config.get('SSH', 'ControlPersist', fallback='10m')
+
+
+def live_masters(config, close=False):
+    # IPs with an open master connection, sessions to them do not need an OTP
+    import glob
+    import shlex
+    import subprocess
+
+    if not control_persist(config) and not close:
+        return []
+    ips = []
+    for path in glob.glob(control_path('*')):
+        ip = path.split('@')[-1]
+        args = shlex.split(config.get('SSH', 'Command')) + ['-o', 'ControlPath=' + path, 'ssh_bastion@' + ip]
+        alive = subprocess.run(args[:1] + ['-O', 'exit' if close else 'check'] + args[1:],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+        if alive and not close:
+            ips.append(ip)
+        elif os.path.exists(path):
+            os.remove(path)
+    return ips
+
+
+def ssh_connect(ip, container, ssh_command='ssh', ssh_options='', password='', persist=''):
+    import shutil
+    import subprocess
+
+    if persist:
+        # The first session becomes the master, the next ones to the same host go through it
+        ssh_options = '{} -o ControlMaster=auto -o ControlPath={} -o ControlPersist={}'.format(ssh_options, control_path(ip), persist)
     command = '{} -t {} ssh_bastion@{} "docker exec -it {} /bin/bash"'.format(ssh_command, ssh_options, ip, container)
 
-    if shutil.which('sshpass') is not None:
+    if not password:
+        info('Reusing the open connection to ' + ip)
+    elif shutil.which('sshpass') is not None:
         command = 'sshpass -p {} {}'.format(password, command)
     else:
         info('Your One Time Password is: ' + password)
@@ -131,12 +256,15 @@ def ssh_connect(ip, container, ssh_command='ssh', ssh_options='', password=''):
 def container_connect(parser, app, cluster, task, container):
     payload = {
         'task': task,
-        'container': container
+        'container': container,
+        'masters': live_masters(parser)
     }
 
     info = ask_api(parser, 'connect/{}/{}'.format(app, cluster), method='POST', payload=payload)
 
     if info.get('error', '') == 'Not_Allowed':
+        from simple_term_menu import TerminalMenu
+
         terminal_menu = TerminalMenu(
             ['Yes', 'No'],
             title='You do not have access to this cluster. Do you want to ask for a temporary access ?'
@@ -149,19 +277,23 @@ def container_connect(parser, app, cluster, task, container):
 
         count = 0
         wait = True
+        deadline = time.time() + ADMIN_TIMEOUT
         while wait:
             print('Waiting for admin to confirm ' + ANIMATION[count % len(ANIMATION)], end='\r')
             count += 1
-            status_request = ask_api(parser, 'checktemp/' + ask_token)
+            started = time.time()
+            # The server holds the request until the admin answer, or up to LONG_POLL seconds
+            status_request = ask_api(parser, 'checktemp/{}?wait={}'.format(ask_token, LONG_POLL), timeout=LONG_POLL)
             if 'status' not in status_request:
                 ip = status_request.get('ip')
                 container = status_request.get('container')
                 password = status_request.get('OTP')
                 wait = False
             else:
-                if count > 300:
+                if time.time() > deadline:
                     fatal('No response from Admin')
-                time.sleep(1)
+                # Older servers answer right away, do not poll them more than once a second
+                time.sleep(max(0, 1 - (time.time() - started)))
     else:
         ip = info.get('ip')
         container = info.get('container')
@@ -172,10 +304,183 @@ def container_connect(parser, app, cluster, task, container):
         container,
         parser.get('SSH', 'Command'),
         parser.get('SSH', 'Options'),
-        password
+        password,
+        control_persist(parser)
     )
 
 
+class Prefetcher:
+    """Load the next menu level in background while the user is looking at the current one"""
+
+    def __init__(self, workers, max_requests):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.max_requests = max_requests
+        self.futures = {}
+
+    def prefetch(self, key, fetch):
+        if key not in self.futures and len(self.futures) < self.max_requests:
+            self.futures[key] = self.pool.submit(fetch)
+
+    def get(self, key, fetch):
+        # Prefetched results are optional calls, ask again (and fail loudly) if it did not work
+        future = self.futures.get(key)
+        result = future.result() if future is not None else None
+        if result is None:
+            result = fetch()
+        return result
+
+    def close(self):
+        # The queued prefetches are not needed anymore, only the running ones are left to finish
+        for future in self.futures.values():
+            future.cancel()
+        self.pool.shutdown(wait=False)
+
+
+def match_names(pattern, names):
+    # Exact name first, then the names matching the pattern as a regex, then the names containing it
+    if pattern in names:
+        return [pattern]
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+        matches = [name for name in names if regex.fullmatch(name)]
+    except re.error:
+        matches = []
+    if not matches:
+        matches = [name for name in names if pattern.lower() in name.lower()]
+    return matches
+
+
+def match_one(pattern, names, level):
+    matches = match_names(pattern, names)
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        fatal('Several {}s match "{}" : {}'.format(level, pattern, ', '.join(matches)))
+    fatal('No {} match "{}", available : {}'.format(level, pattern, ', '.join(names)))
+
+
+def direct_connect(config, menu, target, policy):
+    parts = target.split('/')
+    if len(parts) < 3 or len(parts) > 5:
+        fatal('Target must look like <product>/<env>/<service>[/<task>][/<container>]')
+    product = match_one(parts[0], list(menu.keys()), 'product')
+    env = match_one(parts[1], menu.get(product), 'environment')
+    payload = {
+        'service': parts[2],
+        'task': parts[3] if len(parts) > 3 else '',
+        'container': parts[4] if len(parts) > 4 else '',
+        'policy': policy,
+        'masters': live_masters(config)
+    }
+
+    # The server pick the task and container, and send the connection details in the same call
+    detail = ask_api(config, 'resolve/{}/{}'.format(product, env), method='POST', payload=payload)
+    if detail.get('error') == 'Not_Allowed':
+        fatal('You do not have access to this cluster, run sshecs without arguments to ask for a temporary access')
+    elif 'error' in detail:
+        fatal('Could not find the {} ({}), candidates : {}'.format(
+            detail.get('level', 'container'), detail['error'], ', '.join(detail.get('candidates', []))))
+
+    print('Connecting to container ...')
+    print(display_path([product, env, detail['service'], detail['task'], detail['containerName']]))
+    ssh_connect(
+        detail['ip'],
+        detail['container'],
+        config.get('SSH', 'Command'),
+        config.get('SSH', 'Options'),
+        detail['OTP'],
+        control_persist(config)
+    )
+
+
+def search_containers(config, menu, query, list_only):
+    from urllib.parse import quote
+
+    # The server looks in all the clusters we can access at the same time, from its index
+    answer = ask_api(config, 'search?q=' + quote(query), optional=True)
+    if answer is None:
+        fatal('Search failed, the server may be too old to support it')
+    elif 'error' in answer:
+        fatal('Search failed : {}'.format(answer['error']))
+    for cluster in answer.get('errors', []):
+        info('Could not search in {}'.format(cluster))
+    results = answer.get('results', [])
+    if not results:
+        fatal('Nothing matches "{}"'.format(query))
+
+    labels = ['{}  ({} match: {} {})'.format(r['target'], r['matched'], r['image'], ' '.join(r['ips'])) for r in results]
+    if list_only or not sys.stdout.isatty():
+        print('\n'.join(labels))
+        return
+
+    from simple_term_menu import TerminalMenu
+
+    idx = TerminalMenu(labels, title='{} containers match "{}"'.format(len(results), query)).show()
+    if idx is None:
+        fatal('Action cancelled')
+    direct_connect(config, menu, results[idx]['target'], 'first')
+
+
+def exec_command(detail, command, ssh_command, ssh_options, output_lock):
+    import shlex
+    import subprocess
+
+    prefix = '[{}] '.format(detail['task'].split('/')[-1][:8])
+    remote = 'docker exec {} {}'.format(detail['container'], ' '.join(shlex.quote(c) for c in command))
+    args = ['sshpass', '-p', detail['OTP']] + shlex.split(ssh_command) + shlex.split(ssh_options)
+    args += ['ssh_bastion@' + detail['ip'], remote]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                               universal_newlines=True, errors='replace')
+    for line in process.stdout:
+        with output_lock:
+            print(prefix + line, end='')
+    return process.wait()
+
+
+def fan_out_exec(config, menu, target, command, workers):
+    import shutil
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not command:
+        fatal('Missing the command to run, use: sshecs exec <product>/<env>/<service> -- <command>')
+    if shutil.which('sshpass') is None:
+        fatal('sshpass is needed to run a command on several containers')
+    parts = target.split('/')
+    if len(parts) < 3 or len(parts) > 4:
+        fatal('Target must look like <product>/<env>/<service>[/<container>]')
+    product = match_one(parts[0], list(menu.keys()), 'product')
+    env = match_one(parts[1], menu.get(product), 'environment')
+    payload = {
+        'service': parts[2],
+        'container': parts[3] if len(parts) > 3 else ''
+    }
+
+    # Connection details and OTPs of all the tasks in a single call
+    detail = ask_api(config, 'exec/{}/{}'.format(product, env), method='POST', payload=payload)
+    if detail.get('error') == 'Not_Allowed':
+        fatal('You do not have access to this cluster')
+    elif 'error' in detail:
+        fatal('Could not find the {} ({}), candidates : {}'.format(
+            detail.get('level', 'container'), detail['error'], ', '.join(detail.get('candidates', []))))
+
+    info('Running on {} tasks of {}'.format(len(detail['tasks']), detail['service']))
+    output_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        codes = list(pool.map(
+            lambda task: exec_command(task, command, config.get('SSH', 'Command'), config.get('SSH', 'Options'), output_lock),
+            detail['tasks']
+        ))
+
+    failed = [(task, code) for task, code in zip(detail['tasks'], codes) if code != 0]
+    for task, code in failed:
+        info('{} exited with code {}'.format(task['task'].split('/')[-1], code))
+    info('{}/{} tasks succeeded'.format(len(codes) - len(failed), len(codes)))
+    sys.exit(1 if failed else 0)
+
+
 def main():
     signal.signal(signal.SIGINT, clean_exit)
 
@@ -194,7 +499,70 @@ def main():
         '--allow',
         type=str,
         help='Allow admin to confirm a connection request')
-    args = arg_pars.parse_args()
+    arg_pars.add_argument(
+        '--close-masters',
+        help='Close the SSH master connections kept open to reuse them',
+        action='store_true'
+    )
+    commands = arg_pars.add_subparsers(dest='command')
+    connect_pars = commands.add_parser(
+        'connect',
+        help='Connect directly to a container, without the menus'
+    )
+    connect_pars.add_argument(
+        'target',
+        help='<product>/<env>/<service>[/<task>][/<container>], each part is a name, a regex or a part of the name'
+    )
+    policy = connect_pars.add_mutually_exclusive_group()
+    policy.add_argument(
+        '--first',
+        dest='policy',
+        action='store_const',
+        const='first',
+        help='Connect to the first matching task (default)'
+    )
+    policy.add_argument(
+        '--random-task',
+        dest='policy',
+        action='store_const',
+        const='random',
+        help='Connect to a random matching task'
+    )
+    exec_pars = commands.add_parser(
+        'exec',
+        help='Run a command on every task of a service',
+        usage='%(prog)s [-h] [--workers WORKERS] target -- command'
+    )
+    exec_pars.add_argument(
+        'target',
+        help='<product>/<env>/<service>[/<container>], each part is a name, a regex or a part of the name'
+    )
+    exec_pars.add_argument(
+        '--workers',
+        type=int,
+        default=10,
+        help='Max number of tasks running the command at the same time (default 10)'
+    )
+    search_pars = commands.add_parser(
+        'search',
+        help='Find the containers of a service, container name, image or private ip in all the clusters, and connect to one'
+    )
+    search_pars.add_argument(
+        'query',
+        help='Part of a service name, a container name, an image, or the start of a private ip'
+    )
+    search_pars.add_argument(
+        '--list',
+        help='Only print the matching containers, as targets for "sshecs connect"',
+        action='store_true'
+    )
+    # Everything after -- is the command to run with exec, argparse would try to read its options
+    argv = sys.argv[1:]
+    exec_command = []
+    if '--' in argv:
+        exec_command = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    args = arg_pars.parse_args(argv)
 
     if args.init:
         init_config()
@@ -211,7 +579,11 @@ def main():
         print(ask_api(config, 'validatetemp/' + args.allow))
         clean_exit()
 
-    menu, headers = ask_api(config, 'menu', header=True)
+    if args.close_masters:
+        live_masters(config, close=True)
+        clean_exit()
+
+    menu, headers = ask_api(config, 'menu', header=True, cached=True)
 
     if float(headers.get('Ssh-Tool-Version')) > VERSION:
         fatal(
@@ -219,9 +591,20 @@ def main():
             'Follow process here: https://github.com/antoiner77/ssh-ecs'
         )
 
-    def choose(elements, path, message, goback=True):
+    if args.command == 'connect':
+        direct_connect(config, menu, args.target, args.policy or 'first')
+        clean_exit()
+    elif args.command == 'exec':
+        fan_out_exec(config, menu, args.target, exec_command, args.workers)
+    elif args.command == 'search':
+        search_containers(config, menu, args.query, args.list)
+        clean_exit()
+
+    def choose(elements, path, message, goback=True, labels=None):
+        from simple_term_menu import TerminalMenu
+
         title = 'User: {}\n{}{}'.format(headers.get('Ssh-Tool-User'), display_path(path), message)
-        display = [e.split('/')[-1] for e in elements]
+        display = labels or [e.split('/')[-1] for e in elements]
         if goback:
             display += ['<- Go back']
         idx = TerminalMenu(display, title=title).show()
@@ -236,28 +619,73 @@ def main():
                               include.match(product) and not exclude.match(product)]
         return choose(available_products, [], 'Select a product', goback=False)
 
+    topology = {}
+    prefetcher = Prefetcher(PREFETCH_WORKERS, PREFETCH_MAX)
+
+    def fetch_topology(product, env):
+        return ask_api(config, 'topology/{}/{}'.format(product, env), optional=True, cached=True)
+
+    def fetch_tasks(product, env, service, optional=False):
+        return ask_api(config, 'tasks/{}/{}'.format(product, env), method='POST',
+                       payload={'service': service}, optional=optional)
+
+    def fetch_containers(product, env, service, task, optional=False):
+        return ask_api(config, 'containers/{}/{}'.format(product, env), method='POST',
+                       payload={'service': service, 'task': task}, optional=optional)
+
+    def get_topology(product, env):
+        # Whole cluster in one call, None if the server does not support it
+        if (product, env) not in topology:
+            services = fetch_topology(product, env)
+            if isinstance(services, list):
+                topology[(product, env)] = {s['serviceArn']: s for s in services}
+            else:
+                topology[(product, env)] = None
+        return topology[(product, env)]
+
     def select_environment(product):
         return choose(menu.get(product), [product], 'Select an environment')
 
     def select_service(product, env):
-        all_services = ask_api(config, 'services/{}/{}'.format(product, env))
+        services = get_topology(product, env)
+        if services is not None:
+            all_services = list(services.values())
+        else:
+            all_services = ask_api(config, 'services/{}/{}'.format(product, env), cached=True)
         if 'error' in all_services:
             fatal('Error while getting services')
-        include = re.compile('^.+/' + config.get('Filter', 'Include_Services') + '$')
-        exclude = re.compile('^.+/' + config.get('Filter', 'Exclude_Services') + '$')
-        available_services = [s for s in all_services if include.match(s) and not exclude.match(s)]
-        return choose(available_services, [product, env], 'Select a service')
+        include = re.compile('^' + config.get('Filter', 'Include_Services') + '$')
+        exclude = re.compile('^' + config.get('Filter', 'Exclude_Services') + '$')
+        available_services = [s for s in all_services if include.match(s['serviceName']) and not exclude.match(s['serviceName'])]
+        if services is None:
+            for s in available_services:
+                prefetcher.prefetch(('tasks', product, env, s['serviceArn']),
+                                    lambda s=s: fetch_tasks(product, env, s['serviceArn'], optional=True))
+        labels = ['{} ({}/{})'.format(s['serviceName'], s['runningCount'], s['desiredCount']) for s in available_services]
+        return choose([s['serviceArn'] for s in available_services], [product, env], 'Select a service', labels=labels)
 
     def select_task(product, env, service):
-        all_tasks = ask_api(config, 'tasks/{}/{}'.format(product, env), method='POST',
-                            payload={'service': service})
-        if 'error' in all_tasks:
-            fatal('Error while getting tasks')
+        services = get_topology(product, env)
+        if services is not None:
+            all_tasks = [t['taskArn'] for t in services[service]['tasks']]
+            if not all_tasks:
+                fatal('Error while getting tasks')
+        else:
+            all_tasks = prefetcher.get(('tasks', product, env, service), lambda: fetch_tasks(product, env, service))
+            if 'error' in all_tasks:
+                fatal('Error while getting tasks')
+            for task in all_tasks:
+                prefetcher.prefetch(('containers', product, env, task),
+                                    lambda task=task: fetch_containers(product, env, service, task, optional=True))
         return choose(all_tasks, [product, env, service], 'Select a task')
 
     def select_container(product, env, service, task):
-        all_containers = ask_api(config, 'containers/{}/{}'.format(product, env), method='POST',
-                                 payload={'service': service, 'task': task})
+        services = get_topology(product, env)
+        if services is not None:
+            all_containers = next(t['containers'] for t in services[service]['tasks'] if t['taskArn'] == task)
+        else:
+            all_containers = prefetcher.get(('containers', product, env, task),
+                                            lambda: fetch_containers(product, env, service, task))
         if 'error' in all_containers:
             fatal('Error while getting containers')
         if len(all_containers) == 1:
@@ -286,6 +714,7 @@ def main():
             selected_container = select_container(selected_product, selected_env, selected_service, selected_task)
             step = 'finish' if selected_container else 'task'
 
+    prefetcher.close()
     print('Connecting to container ...')
     print(display_path([selected_product, selected_env, selected_service, selected_task, selected_container]))
     container_connect(config, selected_product, selected_env, selected_task, selected_container)
@@ -0,0 +1,50 @@
+from requests.structures import CaseInsensitiveDict
+
+from sshecs import client
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = CaseInsensitiveDict(headers or {})
+
+
+class FakeSession:
+    endpoint = 'http://server/'
+    headers = {'Authorization': 'Bearer token'}
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = list()
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent.append(headers)
+        return self.responses.pop(0)
+
+
+def test_cached_get_revalidates(tmp_path, monkeypatch):
+    monkeypatch.setattr(client, 'CACHE_DIR', str(tmp_path))
+    session = FakeSession([
+        FakeResponse(200, '["a"]', {'ETag': '"v1"', 'Cache-Control': 'private, max-age=0', 'Ssh-Tool-User': 'alice',
+                                    'Content-Encoding': 'gzip'}),
+        FakeResponse(304, '', {'ETag': '"v1"', 'Cache-Control': 'private, max-age=60'}),
+    ])
+    assert client.cached_get(session, 'services', 1).text == '["a"]'
+    response = client.cached_get(session, 'services', 1)
+    assert response.text == '["a"]'
+    assert response.headers['Ssh-Tool-User'] == 'alice'
+    assert 'Content-Encoding' not in response.headers
+    assert session.sent == [{}, {'If-None-Match': '"v1"'}]
+    # Fresh for 60 seconds now, the server is not called
+    assert client.cached_get(session, 'services', 1).text == '["a"]'
+    assert len(session.sent) == 2
+
+
+def test_cached_get_without_etag(tmp_path, monkeypatch):
+    monkeypatch.setattr(client, 'CACHE_DIR', str(tmp_path))
+    session = FakeSession([FakeResponse(200, '[]'), FakeResponse(200, '[]')])
+    client.cached_get(session, 'services', 1)
+    client.cached_get(session, 'services', 1)
+    assert session.sent == [{}, {}]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,24 @@
+from configparser import ConfigParser
+
+from sshecs import client
+
+
+def config(command, multiplexing='True'):
+    parser = ConfigParser()
+    parser.read_dict({'SSH': {'Command': command, 'Multiplexing': multiplexing}})
+    return parser
+
+
+def test_live_masters(tmp_path, monkeypatch):
+    monkeypatch.setattr(client, 'CONTROL_DIR', str(tmp_path))
+    (tmp_path / 'cm-ssh_bastion@10.0.0.1').touch()
+    assert client.live_masters(config('true')) == ['10.0.0.1']
+    assert client.live_masters(config('true', 'False')) == []
+    # ssh -O check fails, the socket is stale
+    assert client.live_masters(config('false')) == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_control_persist():
+    assert client.control_persist(config('ssh')) == '10m'
+    assert client.control_persist(config('ssh', 'False')) == ''
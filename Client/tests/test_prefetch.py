@@ -0,0 +1,46 @@
+import threading
+
+from sshecs import client
+
+
+def test_prefetch_is_used_and_capped():
+    calls = []
+
+    def fetch(key):
+        calls.append(key)
+        return key
+
+    prefetcher = client.Prefetcher(2, 2)
+    for key in ('a', 'b', 'c'):
+        prefetcher.prefetch(key, lambda key=key: fetch(key))
+    assert prefetcher.get('a', lambda: 'fetched') == 'a'
+    assert prefetcher.get('c', lambda: 'fetched') == 'fetched'
+    prefetcher.pool.shutdown()
+    assert sorted(calls) == ['a', 'b']
+
+
+def test_failed_prefetch_is_fetched_again():
+    prefetcher = client.Prefetcher(1, 10)
+    prefetcher.prefetch('a', lambda: None)
+    assert prefetcher.get('a', lambda: 'fetched') == 'fetched'
+
+
+def test_close_cancels_the_queued_prefetches():
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'a'
+
+    prefetcher = client.Prefetcher(1, 10)
+    prefetcher.prefetch('a', slow)
+    prefetcher.prefetch('b', lambda: calls.append('b'))
+    started.wait(5)
+    prefetcher.close()
+    release.set()
+    prefetcher.pool.shutdown()
+    assert calls == []
+    assert prefetcher.futures['b'].cancelled()
@@ -0,0 +1,22 @@
+from configparser import ConfigParser
+
+import pytest
+
+from sshecs import client
+
+RESULT = {"target": "Service 1/prod-service-1/billing-api/t1/app", "matched": "service", "image": "registry/billing:1",
+          "ips": ["10.0.0.1"]}
+
+
+def test_search_list(monkeypatch, capsys):
+    calls = []
+    monkeypatch.setattr(client, 'ask_api', lambda config, path, **kwargs: calls.append(path) or {"results": [RESULT], "errors": []})
+    client.search_containers(ConfigParser(), {}, 'billing api', list_only=True)
+    assert calls == ['search?q=billing%20api']
+    assert capsys.readouterr().out == 'Service 1/prod-service-1/billing-api/t1/app  (service match: registry/billing:1 10.0.0.1)\n'
+
+
+def test_search_nothing(monkeypatch):
+    monkeypatch.setattr(client, 'ask_api', lambda config, path, **kwargs: {"results": [], "errors": ["Service 2/pp-srv2"]})
+    with pytest.raises(SystemExit):
+        client.search_containers(ConfigParser(), {}, 'billing', list_only=True)
@@ -0,0 +1,14 @@
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location('startup', os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'startup.py'))
+startup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(startup)
+
+
+def test_startup_time():
+    results = startup.run(runs=3)
+    assert results['lazy_imported'] == []
+    assert results['import'] < startup.THRESHOLDS['import']
+    assert results['help'] - results['baseline'] < startup.THRESHOLDS['help']
+    assert results['allow'] - results['baseline'] < startup.THRESHOLDS['allow']
@@ -0,0 +1,232 @@
+"""Local stand-ins for the github, aws, vault and datadog apis, used by the tests and the benchmarks"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubServer:
+    """Local http server answering with a handler function, runs in a background thread
+
+    The handler gets (method, path, headers, body) and returns (operation, status, payload[, headers]), payload is sent
+    as json, or as is when it is a string. Calls are counted per operation, and every answer waits for latency seconds.
+    """
+
+    def __init__(self, handle, latency=0):
+        stub = self
+        self.latency = latency
+        self.requests = list()
+        self.connections = set()
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _answer(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                answer = handle(self.command, self.path, self.headers, body)
+                operation, status, payload = answer[:3]
+                with stub._lock:
+                    stub.requests.append((self.command, self.path, body))
+                    stub.connections.add(self.client_address)
+                    stub.calls[operation] += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), "text/xml"
+                else:
+                    data, content_type = (json.dumps(payload).encode() if payload is not None else b""), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (answer[3] if len(answer) > 3 else {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = _answer
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.calls.clear()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def vault_handler(token="vault-token", secret="ssh/creds/otp_key_role"):
+    def handle(method, path, headers, body):
+        if headers.get("X-Vault-Token") != token:
+            return "denied", 403, {"errors": ["permission denied"]}
+        if method == "GET" and path == "/v1/auth/token/lookup-self":
+            return "lookup-self", 200, {"data": {"id": token}}
+        if method == "POST" and path == "/v1/" + secret:
+            ip = json.loads(body)["ip"]
+            return "otp", 200, {"data": {"ip": ip, "key": "otp-" + ip, "key_type": "otp", "username": "ssh_bastion"}}
+        return "unknown", 404, {"errors": []}
+    return handle
+
+
+def github_handler(org, users, teams, limit=5000):
+    """users: token -> login, teams: team -> list of logins
+
+    Answers have an etag, and a 304 without using the rate limit when it is sent back in If-None-Match.
+    """
+    remaining = {}
+    lock = threading.Lock()
+
+    def answer(operation, status, payload, headers):
+        token = headers.get("Authorization", "")
+        etag = '"%s"' % hashlib.sha256(json.dumps([status, payload]).encode()).hexdigest()
+        with lock:
+            not_modified = headers.get("If-None-Match") == etag
+            left = remaining.setdefault(token, limit)
+            if not not_modified:
+                left = remaining[token] = max(left - 1, 0)
+        headers = {"ETag": etag, "X-RateLimit-Remaining": str(left), "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+        if not_modified:
+            return operation, 304, None, headers
+        return operation, status, payload, headers
+
+    def handle(method, path, headers, body):
+        path = urlsplit(path).path
+        token = headers.get("Authorization", "").replace("token ", "")
+        parts = path.strip("/").split("/")
+        if path == "/user":
+            if token not in users:
+                return answer("user", 401, {"message": "Bad credentials"}, headers)
+            return answer("user", 200, {"login": users[token], "id": 1}, headers)
+        if parts[:2] == ["orgs", org] and parts[2] == "members":
+            return answer("org-member", 204 if parts[3] in users.values() else 404, None, headers)
+        if parts[:2] == ["orgs", org] and parts[2] == "teams" and parts[4] == "memberships":
+            member = parts[5] in teams.get(parts[3], ())
+            return answer("team-membership", 200 if member else 404, {"state": "active"} if member else {"message": "Not Found"}, headers)
+        if parts[:2] == ["orgs", org] and parts[2] == "teams" and parts[4] == "members":
+            return answer("team-members", 200, [{"login": login} for login in teams.get(parts[3], ())], headers)
+        return "unknown", 404, {"message": "Not Found"}
+    return handle
+
+
+def datadog_handler():
+    def handle(method, path, headers, body):
+        return "intake", 200, {}
+    return handle
+
+
+class FakeCluster:
+    """A fake ECS cluster: services running tasks on a few container instances"""
+
+    def __init__(self, name, services=10, tasks=3, instances=5, account="123456789012", region="eu-west-1"):
+        prefix = "arn:aws:ecs:%s:%s:" % (region, account)
+        self.instances = {
+            prefix + "container-instance/%s/ci%d" % (name, i): ("i-%08d" % i, "10.0.%d.%d" % (i // 250, i % 250 + 1))
+            for i in range(instances)
+        }
+        instance_arns = sorted(self.instances)
+        self.services = dict()
+        self.tasks = dict()
+        for s in range(services):
+            service_name = "service-%03d" % s
+            self.services[prefix + "service/%s/%s" % (name, service_name)] = service_name
+            for t in range(tasks):
+                task_id = "%032x" % (s * 1000 + t)
+                task_arn = prefix + "task/%s/%s" % (name, task_id)
+                self.tasks[task_arn] = {
+                    "taskArn": task_arn,
+                    "group": "service:" + service_name,
+                    "lastStatus": "RUNNING",
+                    "desiredStatus": "RUNNING",
+                    "containerInstanceArn": instance_arns[(s + t) % len(instance_arns)],
+                    "containers": [
+                        {"containerArn": prefix + "container/%s/%s/app" % (name, task_id), "name": "app",
+                         "runtimeId": task_id + "-app", "lastStatus": "RUNNING", "image": "registry/%s:1" % service_name},
+                        {"containerArn": prefix + "container/%s/%s/datadog" % (name, task_id), "name": "datadog",
+                         "runtimeId": task_id + "-datadog", "lastStatus": "RUNNING", "image": "datadog/agent:7"},
+                    ]
+                }
+
+
+def _page(items, request, default=100):
+    start = int(request.get("nextToken") or 0)
+    size = request.get("maxResults") or default
+    page = {"items": items[start:start + size]}
+    if start + size < len(items):
+        page["nextToken"] = str(start + size)
+    return page
+
+
+def aws_handler(cluster):
+    """ECS (json protocol), EC2 and STS (query protocol) answers for a FakeCluster"""
+    def ecs(operation, request):
+        if operation == "ListServices":
+            page = _page(sorted(cluster.services), request, 10)
+            return dict({"serviceArns": page.pop("items")}, **page)
+        if operation == "DescribeServices":
+            return {"services": [{
+                "serviceArn": arn, "serviceName": cluster.services[arn],
+                "status": "ACTIVE", "runningCount": 3, "desiredCount": 3, "pendingCount": 0
+            } for arn in request["services"]], "failures": []}
+        if operation == "ListTasks":
+            tasks = sorted(arn for arn, task in cluster.tasks.items()
+                           if "serviceName" not in request or task["group"] == "service:" + request["serviceName"])
+            page = _page(tasks, request)
+            return dict({"taskArns": page.pop("items")}, **page)
+        if operation == "DescribeTasks":
+            by_id = {arn.split("/")[-1]: task for arn, task in cluster.tasks.items()}
+            return {"tasks": [by_id[arn.split("/")[-1]] for arn in request["tasks"]], "failures": []}
+        if operation == "ListContainerInstances":
+            page = _page(sorted(cluster.instances), request)
+            return dict({"containerInstanceArns": page.pop("items")}, **page)
+        if operation == "DescribeContainerInstances":
+            return {"containerInstances": [
+                {"containerInstanceArn": arn, "ec2InstanceId": cluster.instances[arn][0]} for arn in request["containerInstances"]
+            ], "failures": []}
+        raise KeyError(operation)
+
+    def ec2_describe_instances(params):
+        ids = [value[0] for key, value in params.items() if key.startswith("InstanceId.")]
+        ips = {instance_id: ip for instance_id, ip in cluster.instances.values()}
+        items = "".join(
+            "<item><instanceId>%s</instanceId><networkInterfaceSet><item><privateIpAddress>%s</privateIpAddress>"
+            "</item></networkInterfaceSet></item>" % (instance_id, ips[instance_id]) for instance_id in ids)
+        return ('<DescribeInstancesResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/"><requestId>1</requestId>'
+                '<reservationSet><item><reservationId>r-1</reservationId><instancesSet>%s</instancesSet></item>'
+                '</reservationSet></DescribeInstancesResponse>' % items)
+
+    def sts_assume_role(params):
+        return ('<AssumeRoleResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/"><AssumeRoleResult><Credentials>'
+                '<AccessKeyId>ASIAFAKE</AccessKeyId><SecretAccessKey>secret</SecretAccessKey><SessionToken>token</SessionToken>'
+                '<Expiration>2099-01-01T00:00:00Z</Expiration></Credentials><AssumedRoleUser><Arn>%s</Arn>'
+                '<AssumedRoleId>AROAFAKE:session</AssumedRoleId></AssumedRoleUser></AssumeRoleResult>'
+                '<ResponseMetadata><RequestId>1</RequestId></ResponseMetadata></AssumeRoleResponse>' % params["RoleArn"][0])
+
+    def handle(method, path, headers, body):
+        target = headers.get("X-Amz-Target")
+        if target:
+            operation = target.split(".")[-1]
+            return "ecs:" + operation, 200, ecs(operation, json.loads(body or b"{}"))
+        params = parse_qs(body.decode())
+        action = params["Action"][0]
+        if action == "DescribeInstances":
+            return "ec2:DescribeInstances", 200, ec2_describe_instances(params)
+        if action == "AssumeRole":
+            return "sts:AssumeRole", 200, sts_assume_role(params)
+        return "unknown", 400, "<Error><Code>InvalidAction</Code></Error>"
+    return handle
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Latency of the server endpoints, against local stand-ins for github, aws and vault
+
+Run it with `python benchmarks/latency.py` from the Server directory, the results are printed as json,
+and saved to a file with --output so two runs can be compared.
+Every fake api answers after --latency ms, to look like the real ones seen from the bastion.
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes  # noqa: E402
+import serverAws  # noqa: E402
+import serverSettings  # noqa: E402
+
+APP = "Service 2"
+CLUSTER = "uat-srv2"
+USER = "bench-user"
+TOKEN = "bench-token"
+ENDPOINTS = ('/menu', '/services', '/tasks', '/containers', '/connect', '/checktemp', '/search')
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return(values[index])
+
+
+class Bench:
+    """The fakes, and the server loaded from server-http.py and served on a random port"""
+
+    def __init__(self, workdir, services=20, tasks=3, latency=0):
+        self.cluster = fakes.FakeCluster(CLUSTER, services=services, tasks=tasks)
+        self.fakes = {
+            'github': fakes.StubServer(fakes.github_handler(serverSettings.GITHUB_ORG, {TOKEN: USER}, {"srv2-dev": [USER]}), latency),
+            'aws': fakes.StubServer(fakes.aws_handler(self.cluster), latency),
+            'vault': fakes.StubServer(fakes.vault_handler(serverSettings.VAULT_TOKEN, serverSettings.VAULT_SECRET), latency),
+            'datadog': fakes.StubServer(fakes.datadog_handler(), latency),
+        }
+        self._settings = {name: getattr(serverSettings, name) for name in (
+            'GITHUB_API', 'VAULT_ADDR', 'DATADOG_URL', 'SLACK_URL', 'CACHE_ENABLE', 'STORE_PATH', 'SHIPPER_SPILL_PATH',
+            'AWS_ENDPOINT_URL')}
+        self._environ = dict(os.environ)
+        serverSettings.GITHUB_API = self.fakes['github'].url
+        serverSettings.VAULT_ADDR = self.fakes['vault'].url
+        serverSettings.AWS_ENDPOINT_URL = self.fakes['aws'].url
+        serverSettings.DATADOG_URL = self.fakes['datadog'].url + '/v1/input/KEY'
+        serverSettings.SLACK_URL = self.fakes['datadog'].url + '/services/KEY'
+        serverSettings.CACHE_ENABLE = False
+        serverSettings.STORE_PATH = os.path.join(workdir, 'requests.db')
+        serverSettings.SHIPPER_SPILL_PATH = os.path.join(workdir, 'shipper-spill.jsonl')
+        os.environ.update({
+            'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench', 'AWS_DEFAULT_REGION': 'eu-west-1',
+            'AWS_EC2_METADATA_DISABLED': 'true',
+        })
+        serverAws.reset()
+        spec = importlib.util.spec_from_file_location("server_http_bench", os.path.join(SERVER_DIR, "server-http.py"))
+        self.server = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.server)
+        if serverSettings.TEAM_INDEX_ENABLE:
+            self.server.team_index.refresh()
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.http = make_server('127.0.0.1', 0, self.server.app, threaded=True)
+        self.url = 'http://127.0.0.1:%d' % self.http.server_port
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        # Never measure (or call) the real aws by mistake
+        endpoint = serverAws.get_client(APP, 'ecs').meta.endpoint_url
+        if endpoint != self.fakes['aws'].url:
+            self.close()
+            raise RuntimeError("the aws calls would go to " + endpoint + " instead of the fake aws api")
+
+    def close(self):
+        self.http.shutdown()
+        self.server.shipper.flush()
+        for fake in self.fakes.values():
+            fake.close()
+        for name, value in self._settings.items():
+            setattr(serverSettings, name, value)
+        os.environ.clear()
+        os.environ.update(self._environ)
+        serverAws.reset()
+
+    def upstream_calls(self):
+        calls = dict()
+        for name, fake in self.fakes.items():
+            for operation, count in fake.calls.items():
+                calls[name + ':' + operation] = count
+        return(calls)
+
+    def reset_calls(self):
+        for fake in self.fakes.values():
+            fake.reset()
+
+
+def walk(bench):
+    # The calls a client makes to connect to a container, in the order it makes them
+    service = "service-000"
+    task = sorted(arn for arn, t in bench.cluster.tasks.items() if t["group"] == "service:" + service)[0]
+    container = bench.cluster.tasks[task]["containers"][0]
+    requester = str(uuid.uuid4())
+    bench.server.store.add({'name': USER, 'app': APP, 'cluster': CLUSTER, 'task': task,
+                            'container': container["containerArn"] + " - " + container["name"],
+                            'uuidValidator': str(uuid.uuid4()), 'uuidRequester': requester}, valid=True)
+    return({
+        '/menu': ('GET', '/menu', None),
+        '/services': ('GET', '/services/%s/%s' % (APP, CLUSTER), None),
+        '/tasks': ('POST', '/tasks/%s/%s' % (APP, CLUSTER), {"service": service}),
+        '/containers': ('POST', '/containers/%s/%s' % (APP, CLUSTER), {"task": task}),
+        '/connect': ('POST', '/connect/%s/%s' % (APP, CLUSTER),
+                     {"task": task, "container": container["containerArn"] + " - " + container["name"]}),
+        '/checktemp': ('GET', '/checktemp/' + requester, None),
+        '/search': ('GET', '/search?q=' + service, None),
+    })
+
+
+def measure(bench, method, path, payload, iterations, clients):
+    sessions = threading.local()
+
+    def call(_):
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+            session.headers['Authorization'] = 'Bearer ' + TOKEN
+        started = time.perf_counter()
+        response = session.request(method, bench.url + path, json=payload)
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        if isinstance(response.json(), dict) and "error" in response.json():
+            raise RuntimeError(path + ' failed: ' + response.text)
+        return(elapsed)
+
+    bench.reset_calls()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(call, range(iterations)))
+    duration = time.perf_counter() - started
+    return({
+        'p50': round(percentile(latencies, 50) * 1000, 3),
+        'p95': round(percentile(latencies, 95) * 1000, 3),
+        'p99': round(percentile(latencies, 99) * 1000, 3),
+        'mean': round(statistics.mean(latencies) * 1000, 3),
+        'throughput': round(iterations / duration, 1),
+        'upstream_calls': {operation: round(count / iterations, 3) for operation, count in sorted(bench.upstream_calls().items())},
+    })
+
+
+def run(iterations=50, clients=1, services=20, tasks=3, latency=0, endpoints=ENDPOINTS):
+    """Latencies are in ms, upstream_calls is the mean number of calls to each fake api per request"""
+    with tempfile.TemporaryDirectory() as workdir:
+        bench = Bench(workdir, services=services, tasks=tasks, latency=latency / 1000)
+        try:
+            calls = walk(bench)
+            # One call of each first, so the results do not depend on the order of the endpoints
+            for endpoint in endpoints:
+                measure(bench, *calls[endpoint], 1, 1)
+            results = {endpoint: measure(bench, *calls[endpoint], iterations, clients) for endpoint in endpoints}
+        finally:
+            bench.close()
+    return({
+        'settings': {'iterations': iterations, 'clients': clients, 'services': services, 'tasks': tasks, 'latency': latency},
+        'endpoints': results,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of the server endpoints against fake github, aws and vault apis')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per endpoint')
+    parser.add_argument('--clients', type=int, default=1, help='clients sending requests at the same time')
+    parser.add_argument('--services', type=int, default=20, help='services in the fake cluster')
+    parser.add_argument('--tasks', type=int, default=3, help='tasks per service')
+    parser.add_argument('--latency', type=float, default=20, help='latency of the fake apis (ms)')
+    parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='only measure this endpoint (repeatable)')
+    parser.add_argument('--output', help='save the results as json in this file')
+    args = parser.parse_args()
+    results = run(args.iterations, args.clients, args.services, args.tasks, args.latency, args.endpoint or ENDPOINTS)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
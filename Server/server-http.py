@@ -1,105 +1,198 @@
 #!/usr/bin/env python3
 
 from flask import Flask
+from flask import g
 from flask import jsonify
 from flask import make_response
 from flask import request
 from flask_httpauth import HTTPTokenAuth
-from dateutil.tz import tzlocal
-from tinydb import TinyDB, Query
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import gzip
+import hashlib
 import json
-import boto3
-import botocore
-import datetime
+import os
+import random
+import re
 import signal
 import sys
-import requests
-import requests_cache
+import threading
+import time
 import serverSettings
-import hvac
+import serverAws
+import serverCache
+import serverEvents
+import serverGithub
+import serverMetrics
+import serverSearch
+import serverTeams
+import serverStore
+import serverShipper
+import serverVault
 import uuid
 
-db = TinyDB('db.json')
+store = serverStore.open_store(serverSettings.STORE_BACKEND, serverSettings.STORE_PATH, serverSettings.STORE_TTL, serverSettings.REDIS_URL)
+if os.path.isfile('db.json'):
+    store.import_tinydb('db.json')
 
 app = Flask(__name__)
 auth = HTTPTokenAuth(scheme='Bearer')
-
-if serverSettings.CACHE_ENABLE:
-    requests_cache.install_cache(cache_name='github_cache', backend='sqlite', expire_after=180)
+auth_cache = serverCache.open_cache(serverSettings.CACHE_BACKEND, "auth", serverSettings.AUTH_CACHE_SIZE, serverSettings.AUTH_CACHE_TTL,
+                                    serverSettings.REDIS_URL)
+services_cache = serverCache.open_cache(serverSettings.CACHE_BACKEND, "services", serverSettings.SERVICES_CACHE_SIZE,
+                                        serverSettings.SERVICES_CACHE_TTL, serverSettings.REDIS_URL)
+instances_cache = serverCache.open_cache(serverSettings.CACHE_BACKEND, "instances", serverSettings.INSTANCES_CACHE_SIZE,
+                                         serverSettings.INSTANCES_CACHE_TTL, serverSettings.REDIS_URL)
+# Running tasks of a service, and summary of a task, kept up to date by the ecs events
+tasks_cache = serverCache.open_cache(serverSettings.CACHE_BACKEND, "tasks", serverSettings.TASKS_CACHE_SIZE,
+                                     serverSettings.TASKS_CACHE_TTL, serverSettings.REDIS_URL)
+task_cache = serverCache.open_cache(serverSettings.CACHE_BACKEND, "task", serverSettings.TASKS_CACHE_SIZE,
+                                    serverSettings.TASKS_CACHE_TTL, serverSettings.REDIS_URL)
+# Bumped by the ecs events for each cache key they change, see fill_cache
+generations = serverCache.open_cache(serverSettings.CACHE_BACKEND, "generations", serverSettings.TASKS_CACHE_SIZE, 3600,
+                                     serverSettings.REDIS_URL)
+# Shared by all the requests to run their independent github and aws calls at the same time
+upstream_pool = ThreadPoolExecutor(max_workers=serverSettings.UPSTREAM_WORKERS, thread_name_prefix="upstream")
+# Identical github and aws calls made by several requests at the same time share a single call
+flights = serverCache.SingleFlight(serverSettings.SINGLEFLIGHT_TIMEOUT)
+github = serverGithub.from_settings()
+team_index = serverTeams.TeamIndex(serverSettings.TEAM_INDEX_REFRESH, serverSettings.TEAM_INDEX_MAX_AGE, github.team_members,
+                                   serverCache.open_cache(serverSettings.CACHE_BACKEND, "teams", 1024, serverSettings.TEAM_INDEX_MAX_AGE,
+                                                          serverSettings.REDIS_URL))
+vault = serverVault.from_settings()
+shipper = serverShipper.Shipper(
+    maxsize=serverSettings.SHIPPER_QUEUE_SIZE, batch_size=serverSettings.SHIPPER_BATCH_SIZE, retries=serverSettings.SHIPPER_RETRIES,
+    timeout=serverSettings.SHIPPER_TIMEOUT, full_policy=serverSettings.SHIPPER_FULL_POLICY, spill_path=serverSettings.SHIPPER_SPILL_PATH)
+# The menu only change with the settings, its body and etag are computed once
+MENU_BODY = json.dumps(serverSettings.MENU)
+MENU_ETAG = hashlib.sha256((MENU_BODY + str(serverSettings.VERSION)).encode('utf-8')).hexdigest()
+# uuidRequester -> [event set when the temporary access is validated, number of /checktemp waiting on it]
+approvals = dict()
+approvals_lock = threading.Lock()
+serverMetrics.TEMP_PENDING.set_function(store.count_waiting)
 
 
 @auth.verify_token
 def verify_token(token):
-    headers = {'Authorization': 'token ' + token}
-    login = requests.get('https://api.github.com/user', headers=headers)
-    if "message" not in login.json():
-        username = login.json()["login"]
-        id = login.json()["id"]
-        headers = {'Authorization': 'token ' + serverSettings.GITHUB_ADMIN_TOKEN}
-        githubOrg = requests.get('https://api.github.com/orgs/' + serverSettings.GITHUB_ORG + '/members/' + username, headers=headers)
-        if githubOrg.status_code == 204:
-            return({"username": username, "id": id})
+    if not token:
+        return(False)
+    key = serverCache.hash_key(token)
+    user = auth_cache.get(key)
+    if user is not None:
+        return(user)
+    return(flights.do(("login", key), check_login, token, key))
+
+
+def check_login(token, key):
+    user = False
+    login = github.user(token)
+    if login is not None and github.is_org_member(login["login"]):
+        user = {"username": login["login"], "id": login["id"]}
+    # Failed logins are cached too, but not for long, so a fixed token or a new org member get in quickly
+    auth_cache.set(key, user, ttl=None if user else serverSettings.AUTH_CACHE_NEGATIVE_TTL)
+    return(user)
 
 
 def verify_access(app, cluster, username):
     allowed_groups = serverSettings.MAP_GROUP[app][cluster]
-    headers = {'Authorization': 'token ' + serverSettings.GITHUB_ADMIN_TOKEN}
+    unknown_groups = list()
     for allowed_group in allowed_groups:
-        githubOrg = requests.get('https://api.github.com/orgs/' + serverSettings.GITHUB_ORG + '/teams/' + allowed_group + '/memberships/' + username, headers=headers)
-        if githubOrg.status_code == 200:
+        member = team_index.is_member(allowed_group, username) if serverSettings.TEAM_INDEX_ENABLE else None
+        if member:
+            return True
+        if member is None:
+            unknown_groups.append(allowed_group)
+    # Ask github for all the teams missing from the index at the same time
+    checks = [upstream_pool.submit(flights.do, ("team-membership", allowed_group, username.lower()), github.is_team_member,
+                                   allowed_group, username) for allowed_group in unknown_groups]
+    for check in as_completed(checks):
+        if check.result():
             return True
     return False
 
 
 def signal_handler(sig, frame):
+    shipper.flush()
     sys.exit(0)
 
 
 def log_action(message):
     if serverSettings.LOG_DATADOG:
-        headers = {'Content-type': 'application/json'}
         myobj = {"service": "ssh-tool", "message": message, "ddsource": "ssh-tool-server", "hostname": "ssh-bastion"}
-        requests.post(serverSettings.DATADOG_URL, json=myobj, headers=headers)
+        shipper.send(serverSettings.DATADOG_URL, myobj, batch=True)
     else:
         print(message)
 
 
-def assumed_role_session(role_arn: str, base_session: botocore.session.Session = None):
-    base_session = base_session or boto3.session.Session()._session
-    fetcher = botocore.credentials.AssumeRoleCredentialFetcher(
-        client_creator=base_session.create_client,
-        source_credentials=base_session.get_credentials(),
-        role_arn=role_arn,
-        extra_args={}
-    )
-    creds = botocore.credentials.DeferredRefreshableCredentials(
-        method='assume-role',
-        refresh_using=fetcher.fetch_credentials,
-        time_fetcher=lambda: datetime.datetime.now(tzlocal())
-    )
-    botocore_session = botocore.session.Session()
-    botocore_session._credentials = creds
-    return boto3.Session(botocore_session=botocore_session)
-
-
 def createBotoClient(app, ecs=True, ec2=False):
     if app not in serverSettings.MAP_GROUP:
         return(False)
-    if serverSettings.MAP_GROUP[app]["aws"] != "root":
-        session = assumed_role_session(serverSettings.MAP_GROUP[app]["aws"])
-        client_ecs = session.client('ecs', region_name=serverSettings.MAP_GROUP[app]["region"])
-        if ec2:
-            client_ec2 = session.client('ec2', region_name=serverSettings.MAP_GROUP[app]["region"])
-    else:
-        client_ecs = boto3.client('ecs', region_name=serverSettings.MAP_GROUP[app]["region"])
-        if ec2:
-            client_ec2 = boto3.client('ec2', region_name="eu-west-1")
+    client_ecs = serverAws.get_client(app, 'ecs')
     if ec2:
-        return(client_ecs, client_ec2)
+        return(client_ecs, serverAws.get_client(app, 'ec2'))
     else:
         return(client_ecs)
 
 
+def cacheable(response, max_age=0, etag=None):
+    # The client keeps these answers on disk, and asks again with If-None-Match once they are older than max_age
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    return(response)
+
+
+def fill_cache(cache, flight_key, function, *args):
+    # Load a missing value once for all the requests, the flight key is the name of the call followed by the cache key
+    # The value is not kept if an ecs event changed the key during the call, it could be older than the event
+    def load():
+        return(generations.get(flight_key, 0), function(*args))
+    generation, value = flights.do(flight_key, load)
+    if generations.get(flight_key, 0) == generation:
+        cache.set(flight_key[1:], value)
+    return(value)
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    # Registered first so it runs last, after the compression
+    if 'started' in g:
+        route = request.url_rule.rule if request.url_rule else "unknown"
+        serverMetrics.REQUEST_DURATION.labels(route, request.method, response.status_code).observe(time.perf_counter() - g.started)
+    return(response)
+
+
+@app.after_request
+def compress(response):
+    # Big json lists (services, topology) compress very well, small answers are not worth it
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+        return(response)
+    data = response.get_data()
+    if len(data) < serverSettings.GZIP_MIN_SIZE:
+        return(response)
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return(response)
+
+
+# after_request functions run in reverse order, this one runs before compress
+@app.after_request
+def conditional(response):
+    if request.method == 'GET' and response.status_code == 200 and response.get_etag()[0]:
+        # Answer 304 when the client already has this version
+        response.make_conditional(request)
+    return(response)
+
+
 #
 #    SEND HEALTH
 #
@@ -109,6 +202,20 @@ def sendHealth():
     return("ok")
 
 
+#
+#    SEND METRICS
+#
+# Not behind the github auth, prometheus can only send a static token
+@app.route('/metrics')
+def sendMetrics():
+    if not serverSettings.METRICS_ENABLE:
+        return(jsonify({"error": "Not_Found"}), 404)
+    if serverSettings.METRICS_TOKEN and request.headers.get('Authorization') != 'Bearer ' + serverSettings.METRICS_TOKEN:
+        return(jsonify({"error": "Not_Allowed"}), 401)
+    body, content_type = serverMetrics.render()
+    return(body, 200, {'Content-Type': content_type})
+
+
 #
 #    SEND MENU
 #
@@ -116,10 +223,11 @@ def sendHealth():
 @app.route('/menu')
 @auth.login_required
 def sendMenu():
-    resp = make_response(jsonify(serverSettings.MENU))
+    resp = make_response(MENU_BODY)
+    resp.mimetype = 'application/json'
     resp.headers['Ssh-Tool-User'] = auth.current_user()["username"]
     resp.headers['Ssh-Tool-Version'] = serverSettings.VERSION
-    return(resp)
+    return(cacheable(resp, serverSettings.MENU_MAX_AGE, MENU_ETAG))
 
 
 #
@@ -132,10 +240,38 @@ def sendServices(app, cluster):
     client = createBotoClient(app)
     if not client:
         return(jsonify({"error": "UNSUPORTED"}))
-    response = client.list_services(
-                    cluster=cluster
+    return(cacheable(jsonify(get_services(app, cluster, client)), serverSettings.SERVICES_MAX_AGE))
+
+
+def get_services(app, cluster, client):
+    services = services_cache.get((app, cluster))
+    if services is None:
+        services = fill_cache(services_cache, ("list_services", app, cluster), list_services, client, cluster)
+    return(services)
+
+
+def list_services(client, cluster):
+    service_arns = list()
+    paginator = client.get_paginator('list_services')
+    for page in paginator.paginate(cluster=cluster, PaginationConfig={'PageSize': 100}):
+        service_arns.extend(page["serviceArns"])
+    services = list()
+    # describe_services only accept 10 services per call
+    for i in range(0, len(service_arns), 10):
+        response = client.describe_services(
+                    cluster=cluster,
+                    services=service_arns[i:i + 10]
                 )
-    return(jsonify(response["serviceArns"]))
+        for service in response["services"]:
+            services.append({
+                "serviceArn": service["serviceArn"],
+                "serviceName": service["serviceName"],
+                "status": service["status"],
+                "runningCount": service["runningCount"],
+                "desiredCount": service["desiredCount"],
+                "pendingCount": service["pendingCount"]
+            })
+    return(sorted(services, key=lambda service: service["serviceName"]))
 
 
 #
@@ -150,19 +286,31 @@ def sendTasks(app, cluster):
         client = createBotoClient(app)
         if not client:
             return(jsonify({"error": "UNSUPORTED"}))
-        response = client.list_tasks(
-            cluster=cluster,
-            serviceName=service.split("/")[-1],
-            desiredStatus='RUNNING'
-        )
-        if len(response["taskArns"]) == 0:
+        task_arns = service_tasks(app, cluster, client, service.split("/")[-1])
+        if len(task_arns) == 0:
             return(jsonify({"error": "UNSUPORTED"}))
         else:
-            return(json.dumps(response["taskArns"]))
+            return(json.dumps(task_arns))
     else:
         return(jsonify({"error": "missig arg"}))
 
 
+def service_tasks(app, cluster, client, service_name):
+    task_arns = tasks_cache.get((app, cluster, service_name))
+    if task_arns is None:
+        task_arns = fill_cache(tasks_cache, ("list_tasks", app, cluster, service_name), list_service_tasks, client, cluster, service_name)
+    return(task_arns)
+
+
+def list_service_tasks(client, cluster, service_name):
+    task_arns = list()
+    paginator = client.get_paginator('list_tasks')
+    for page in paginator.paginate(cluster=cluster, serviceName=service_name, desiredStatus='RUNNING',
+                                   PaginationConfig={'PageSize': 100}):
+        task_arns.extend(page["taskArns"])
+    return(task_arns)
+
+
 #
 #    SEND CONTAINERS
 #
@@ -175,55 +323,265 @@ def sendContainers(app, cluster):
         client = createBotoClient(app)
         if not client:
             return(jsonify({"error": "UNSUPORTED"}))
+        return(jsonify(list_containers(describe_task(app, cluster, client, task))))
+    else:
+        return(jsonify({"error": "missig arg"}))
+
+
+def list_containers(task):
+    containers = list()
+    for container in task["containers"]:
+        containers.append(container["containerArn"] + " - " + container["name"])
+    return(containers)
+
+
+#
+#    SEND TOPOLOGY
+#
+#
+@app.route('/topology/<app>/<cluster>')
+@auth.login_required
+def sendTopology(app, cluster):
+    client = createBotoClient(app)
+    if not client:
+        return(jsonify({"error": "UNSUPORTED"}))
+    topology = flights.do(("topology", app, cluster), build_topology, client, cluster, get_services(app, cluster, client))
+    return(cacheable(jsonify(topology)))
+
+
+def build_topology(client, cluster, services):
+    # Every running task of the cluster in a few calls, instead of one list_tasks per service
+    service_tasks = dict()
+    for task in describe_tasks(client, cluster, list_cluster_tasks(client, cluster)):
+        # Tasks started by a service belong to the group "service:<name>"
+        group = task.get("group", "")
+        if group.startswith("service:"):
+            service_tasks.setdefault(group[len("service:"):], []).append({
+                "taskArn": task["taskArn"],
+                "lastStatus": task["lastStatus"],
+                "containers": list_containers(task)
+            })
+    return([dict(service, tasks=service_tasks.get(service["serviceName"], [])) for service in services])
+
+
+def list_cluster_tasks(client, cluster):
+    task_arns = list()
+    paginator = client.get_paginator('list_tasks')
+    for page in paginator.paginate(cluster=cluster, desiredStatus='RUNNING', PaginationConfig={'PageSize': 100}):
+        task_arns.extend(page["taskArns"])
+    return(task_arns)
+
+
+def describe_task(app, cluster, client, task):
+    task_id = task.split("/")[-1]
+    summary = task_cache.get((app, cluster, task_id))
+    if summary is None:
+        summary = fill_cache(task_cache, ("describe_task", app, cluster, task_id), describe_task_summary, client, cluster, task_id)
+    return(summary)
+
+
+def describe_task_summary(client, cluster, task_id):
+    return(serverEvents.task_summary(describe_tasks(client, cluster, [task_id])[0]))
+
+
+def describe_tasks(client, cluster, task_arns):
+    tasks = list()
+    # describe_tasks only accept 100 tasks per call
+    for i in range(0, len(task_arns), 100):
         response = client.describe_tasks(
                     cluster=cluster,
-                    tasks=[
-                        task.split("/")[-1],
-                    ],
+                    tasks=task_arns[i:i + 100]
                 )
-        containers = list()
-        for container in response["tasks"][0]["containers"]:
-            containers.append(container["containerArn"] + " - " + container["name"])
-        return(jsonify(containers))
-    else:
+        tasks.extend(response["tasks"])
+    return(tasks)
+
+
+#
+#    SEARCH
+#
+# Containers of all the clusters the user can access, by service, container, image or private ip
+@app.route('/search')
+@auth.login_required
+def sendSearch():
+    query = request.args.get('q', '').strip()
+    if not query:
         return(jsonify({"error": "missig arg"}))
+    username = auth.current_user()["username"]
+    # In this thread: verify_access waits on upstream_pool for the github checks, it must not run in the pool itself
+    allowed = [(app, cluster) for app, cluster in serverSearch.all_clusters() if verify_access(app, cluster, username)]
+    results, errors = search_index.search(query, allowed, serverSettings.SEARCH_MAX_RESULTS)
+    for result in results:
+        # What the client gives to /resolve to connect to this container
+        result["target"] = "/".join([result["app"], result["cluster"], result["service"], result["task"].split("/")[-1],
+                                     result["containerName"]])
+    return(jsonify({"query": query, "results": results, "errors": errors}))
+
+
+def build_search_entries(app, cluster):
+    clients = createBotoClient(app, ec2=True)
+    if not clients:
+        return([])
+    client, client_ec2 = clients
+    entries = list()
+    for task in describe_tasks(client, cluster, list_cluster_tasks(client, cluster)):
+        group = task.get("group", "")
+        if not group.startswith("service:"):
+            continue
+        # Tasks on fargate have no container instance, /resolve cannot connect to them
+        if not task.get("containerInstanceArn"):
+            continue
+        ip = get_instance_ip(app, cluster, client, client_ec2, task["containerInstanceArn"])
+        for container in task["containers"]:
+            ips = [ip] + [interface.get("privateIpv4Address") for interface in container.get("networkInterfaces", [])]
+            entries.append({
+                "app": app,
+                "cluster": cluster,
+                "service": group[len("service:"):],
+                "task": task["taskArn"],
+                "container": container["containerArn"] + " - " + container["name"],
+                "containerName": container["name"],
+                "image": container.get("image", ""),
+                "ips": [address for address in ips if address]
+            })
+    return(entries)
+
+
+search_index = serverSearch.SearchIndex(build_search_entries, serverSettings.SEARCH_INDEX_REFRESH, serverSettings.SEARCH_INDEX_MAX_AGE,
+                                        serverSettings.SEARCH_WORKERS, flights)
+
+
+#
+#    ECS EVENTS
+#
+# Keep the caches up to date with the task and container instance state changes
+def apply_event(event):
+    detail = event.get("detail", {})
+    if "clusterArn" not in detail:
+        return
+    cluster = detail["clusterArn"].split("/")[-1]
+    for app in serverEvents.apps_of_cluster(detail["clusterArn"]):
+        if event.get("detail-type") == serverEvents.TASK_STATE_CHANGE:
+            apply_task_event(app, cluster, serverEvents.task_summary(detail))
+        elif event.get("detail-type") == serverEvents.INSTANCE_STATE_CHANGE:
+            apply_instance_event(app, cluster, detail)
+
+
+def bump_generation(flight_key):
+    # The events are applied by a single thread, nothing else writes the generations
+    generations.set(flight_key, generations.get(flight_key, 0) + 1)
+
+
+def apply_task_event(app, cluster, task):
+    task_id = task["taskArn"].split("/")[-1]
+    known = task_cache.get((app, cluster, task_id))
+    if known is not None and known["version"] > task["version"]:
+        # Events can arrive out of order, this one is older than what we have
+        return
+    bump_generation(("describe_task", app, cluster, task_id))
+    task_cache.set((app, cluster, task_id), task)
+    if not task["group"].startswith("service:"):
+        return
+    service_name = task["group"][len("service:"):]
+    bump_generation(("list_tasks", app, cluster, service_name))
+    # Same tasks as list_tasks(desiredStatus='RUNNING')
+    task_arns = tasks_cache.get((app, cluster, service_name))
+    if task_arns is not None:
+        listed = task["taskArn"] in task_arns
+        if task["desiredStatus"] == "RUNNING" and not listed:
+            tasks_cache.set((app, cluster, service_name), task_arns + [task["taskArn"]])
+        elif task["desiredStatus"] != "RUNNING" and listed:
+            tasks_cache.set((app, cluster, service_name), [arn for arn in task_arns if arn != task["taskArn"]])
+    if task["lastStatus"] in ("RUNNING", "STOPPED"):
+        # The running count of the service changed
+        bump_generation(("list_services", app, cluster))
+        services_cache.delete((app, cluster))
+
+
+def apply_instance_event(app, cluster, instance):
+    if instance.get("status") in ("ACTIVE", "DRAINING"):
+        # A new instance is added to the cache the first time one of its tasks is asked for
+        return
+    bump_generation(("instances", app, cluster))
+    instances = instances_cache.get((app, cluster))
+    if instances is not None and instance["containerInstanceArn"] in instances:
+        instances = dict(instances)
+        del instances[instance["containerInstanceArn"]]
+        instances_cache.set((app, cluster), instances)
+
+
+events = serverEvents.from_settings(apply_event) if serverSettings.EVENTS_ENABLE else None
 
 
 #
 # GET CONTAINER DETAILS
 #
 #
-def getConnectDetail(app, cluster, task, container):
-    client, client_ec2 = createBotoClient(app, ec2=True)
-    if not client:
+def getConnectDetail(app, cluster, task, container, target=None, masters=()):
+    if target is None:
+        target = resolve_target(app, cluster, task, container)
+    if target is None:
         return(jsonify({"error": "UNSUPORTED"}))
-    response = client.describe_tasks(
-                cluster=cluster,
-                tasks=[
-                    task.split("/")[-1],
-                ])
+    return(jsonify(issue_connection(cluster, *target, masters=masters)))
+
+
+def issue_connection(cluster, ip, runtimeId, masters=()):
+    log_action("User " + auth.current_user()["username"] + " requested access to " + cluster)
+    # The client already has an ssh connection open to this host, it does not need an OTP
+    otp = "" if ip in masters else vault.issue_otp(ip)
+    return({"ip": ip, "container": runtimeId, "OTP": otp})
+
+
+def resolve_target(app, cluster, task, container):
+    clients = createBotoClient(app, ec2=True)
+    if not clients:
+        return(None)
+    client, client_ec2 = clients
+    described = describe_task(app, cluster, client, task)
     runtimeId = ""
-    for cont in response["tasks"][0]["containers"]:
+    for cont in described["containers"]:
         if container.split(" ")[0] == cont["containerArn"]:
             runtimeId = cont["runtimeId"]
-    response = client.describe_container_instances(
-                cluster=cluster,
-                containerInstances=[
-                    response["tasks"][0]["containerInstanceArn"],
-                ])
-    ec2_id = response["containerInstances"][0]["ec2InstanceId"]
-    response = client_ec2.describe_instances(
-                InstanceIds=[
-                    ec2_id,
-                ]
-            )
-    log_action("User " + auth.current_user()["username"] + " requested access to " + cluster)
-    vault_client = hvac.Client(
-        url=serverSettings.VAULT_ADDR,
-        token=serverSettings.VAULT_TOKEN, verify=False)
-    otp = vault_client.write(
-        serverSettings.VAULT_SECRET, ip=response["Reservations"][0]["Instances"][0]["NetworkInterfaces"][0]["PrivateIpAddress"])["data"]["key"]
-    return(jsonify({"ip": response["Reservations"][0]["Instances"][0]["NetworkInterfaces"][0]["PrivateIpAddress"], "container": runtimeId, "OTP": otp}))
+    ip = get_instance_ip(app, cluster, client, client_ec2, described["containerInstanceArn"])
+    if ip is None:
+        return(None)
+    return((ip, runtimeId))
+
+
+def get_instance_ip(app, cluster, client, client_ec2, container_instance_arn):
+    instances = instances_cache.get((app, cluster))
+    if instances is None or container_instance_arn not in instances:
+        # Unknown instance, probably a new one in the cluster, reload them all
+        instances = fill_cache(instances_cache, ("instances", app, cluster), list_instance_ips, client, client_ec2, cluster)
+    return(instances.get(container_instance_arn))
+
+
+def list_instance_ips(client, client_ec2, cluster):
+    instance_arns = list()
+    paginator = client.get_paginator('list_container_instances')
+    for page in paginator.paginate(cluster=cluster, PaginationConfig={'PageSize': 100}):
+        instance_arns.extend(page["containerInstanceArns"])
+    ec2_ids = dict()
+    # describe_container_instances only accept 100 instances per call
+    for i in range(0, len(instance_arns), 100):
+        response = client.describe_container_instances(
+                    cluster=cluster,
+                    containerInstances=instance_arns[i:i + 100]
+                )
+        for instance in response["containerInstances"]:
+            ec2_ids[instance["ec2InstanceId"]] = instance["containerInstanceArn"]
+    ips = dict()
+    ec2_list = list(ec2_ids)
+    for i in range(0, len(ec2_list), 100):
+        response = client_ec2.describe_instances(
+                    InstanceIds=ec2_list[i:i + 100]
+                )
+        for reservation in response["Reservations"]:
+            for instance in reservation["Instances"]:
+                # A terminated instance stays in the cluster for a while, without network interface: no ip for it
+                interfaces = [interface for interface in instance.get("NetworkInterfaces", []) if interface.get("PrivateIpAddress")]
+                if interfaces:
+                    ips[ec2_ids[instance["InstanceId"]]] = interfaces[0]["PrivateIpAddress"]
+    return(ips)
 
 
 #
@@ -239,14 +597,127 @@ def sendConnect(app, cluster):
             container = request.json["container"]
         else:
             return(jsonify({"error": "missig arg"}))
-        # Check if user is allowed
+        # Look for the container while we check if user is allowed, it is only used if he is
+        target = upstream_pool.submit(resolve_target, app, cluster, task, container)
         if not verify_access(app, cluster, auth.current_user()["username"]):
             return(jsonify({"error": "Not_Allowed"}))
-        return(getConnectDetail(app, cluster, task, container))
+        return(getConnectDetail(app, cluster, task, container, target.result(), request.json.get("masters", ())))
     else:
         return(jsonify({"error": "missig arg"}))
 
 
+#
+#    RESOLVE AND CONNECT
+#
+# From a service, and optionaly a task and a container, to the connection details in a single call
+@app.route('/resolve/<app>/<cluster>', methods=['POST'])
+@auth.login_required
+def sendResolve(app, cluster):
+    if "service" not in request.json:
+        return(jsonify({"error": "missig arg"}))
+    clients = createBotoClient(app, ec2=True)
+    if not clients:
+        return(jsonify({"error": "UNSUPORTED"}))
+    client, client_ec2 = clients
+    if not verify_access(app, cluster, auth.current_user()["username"]):
+        return(jsonify({"error": "Not_Allowed"}))
+
+    service, error = find_service(app, cluster, client, request.json["service"])
+    if error:
+        return(jsonify(error))
+
+    tasks = connectable_tasks(describe_tasks(client, cluster, service_tasks(app, cluster, client, service)))
+    tasks = {task["taskArn"].split("/")[-1]: task for task in tasks}
+    task_ids = match_names(request.json.get("task") or ".*", sorted(tasks))
+    if not task_ids:
+        return(jsonify({"error": "Not_Found", "level": "task", "candidates": sorted(tasks)}))
+    task = tasks[random.choice(task_ids) if request.json.get("policy") == "random" else task_ids[0]]
+
+    container, error = find_container(task, request.json.get("container"))
+    if error:
+        return(jsonify(error))
+
+    ip = get_instance_ip(app, cluster, client, client_ec2, task["containerInstanceArn"])
+    if ip is None:
+        return(jsonify({"error": "UNSUPORTED"}))
+    detail = issue_connection(cluster, ip, container["runtimeId"], request.json.get("masters", ()))
+    detail.update({"service": service, "task": task["taskArn"], "containerName": container["name"]})
+    return(jsonify(detail))
+
+
+#
+#    FAN OUT EXEC
+#
+# Connection details of every task of a service, with one OTP per task
+@app.route('/exec/<app>/<cluster>', methods=['POST'])
+@auth.login_required
+def sendExec(app, cluster):
+    if "service" not in request.json:
+        return(jsonify({"error": "missig arg"}))
+    clients = createBotoClient(app, ec2=True)
+    if not clients:
+        return(jsonify({"error": "UNSUPORTED"}))
+    client, client_ec2 = clients
+    if not verify_access(app, cluster, auth.current_user()["username"]):
+        return(jsonify({"error": "Not_Allowed"}))
+
+    service, error = find_service(app, cluster, client, request.json["service"])
+    if error:
+        return(jsonify(error))
+    details = list()
+    for task in connectable_tasks(describe_tasks(client, cluster, service_tasks(app, cluster, client, service))):
+        container, error = find_container(task, request.json.get("container"))
+        if error:
+            return(jsonify(error))
+        ip = get_instance_ip(app, cluster, client, client_ec2, task["containerInstanceArn"])
+        if ip is None:
+            return(jsonify({"error": "UNSUPORTED"}))
+        details.append({"ip": ip, "container": container["runtimeId"], "task": task["taskArn"], "containerName": container["name"]})
+    if not details:
+        return(jsonify({"error": "Not_Found", "level": "task", "candidates": []}))
+
+    username = auth.current_user()["username"]
+    log_action("User " + username + " requested exec on " + str(len(details)) + " tasks of " + service + " in " + cluster)
+    # OTPs can only be used once, even for tasks running on the same instance
+    for detail, otp in zip(details, vault.issue_otps([detail["ip"] for detail in details])):
+        detail["OTP"] = otp
+    return(jsonify({"service": service, "tasks": details}))
+
+
+def find_service(app, cluster, client, pattern):
+    services = match_names(pattern, [s["serviceName"] for s in get_services(app, cluster, client)])
+    if len(services) != 1:
+        return(None, {"error": "Ambiguous" if services else "Not_Found", "level": "service", "candidates": services})
+    return(services[0], None)
+
+
+def connectable_tasks(tasks):
+    # Tasks on fargate have no container instance, there is no host to connect to
+    return([task for task in tasks if task.get("containerInstanceArn")])
+
+
+def find_container(task, pattern):
+    containers = {container["name"]: container for container in task["containers"]}
+    names = match_names(pattern or ".*", sorted(containers))
+    if len(names) != 1:
+        return(None, {"error": "Ambiguous" if names else "Not_Found", "level": "container", "candidates": names or sorted(containers)})
+    return(containers[names[0]], None)
+
+
+def match_names(pattern, names):
+    # Exact name first, then the names matching the pattern as a regex, then the names containing it
+    if pattern in names:
+        return([pattern])
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+        matches = [name for name in names if regex.fullmatch(name)]
+    except re.error:
+        matches = list()
+    if not matches:
+        matches = [name for name in names if pattern.lower() in name.lower()]
+    return(matches)
+
+
 #
 #
 # ASK TEMP ACCESS
@@ -263,13 +734,10 @@ def askTemp(app, cluster):
         user = auth.current_user()["username"]
         uuidRequester = str(uuid.uuid4())
         uuidValidator = str(uuid.uuid4())
-        webhook_url = serverSettings.SLACK_URL
         slack_data = {'username': 'SSH-ECS', 'text': "User: `" + user + "` wants to access to *" + app + "* - *" + cluster + "*. To accept this request, please run the following command as an admin :julsign: : \n `sshecs --allow " + uuidValidator + "`"}
-        requests.post(
-            webhook_url, data=json.dumps(slack_data),
-            headers={'Content-Type': 'application/json'}
-            )
-        db.insert({'name': user, 'app': app, 'cluster': cluster, 'task': task, 'container': container, 'uuidValidator': uuidValidator, 'uuidRequester': uuidRequester, 'valid': False})
+        shipper.send(serverSettings.SLACK_URL, slack_data)
+        store.add({'name': user, 'app': app, 'cluster': cluster, 'task': task, 'container': container,
+                   'uuidValidator': uuidValidator, 'uuidRequester': uuidRequester})
         return(jsonify({"token": uuidRequester}))
     else:
         return(jsonify({"error": "missig arg"}))
@@ -282,15 +750,53 @@ def askTemp(app, cluster):
 @app.route('/checktemp/<id>')
 @auth.login_required
 def checkTemp(id):
-    db_request = Query()
-    db_result = db.search(db_request.uuidRequester == id)
-    if len(db_result) == 0:
-        return(jsonify({"status": "invalid"}))
-    else:
-        if db_result[0]["valid"]:
-            return(getConnectDetail(db_result[0]["app"], db_result[0]["cluster"], db_result[0]["task"], db_result[0]["container"]))
-        else:
-            return(jsonify({"status": "waiting"}))
+    # Long polling, we register for the validation before reading the store so we can not miss it in between
+    wait = min(request.args.get('wait', 0, type=float), serverSettings.CHECKTEMP_MAX_WAIT)
+    event = approval_event(id) if wait > 0 else None
+    try:
+        db_result = store.get_by_requester(id)
+        if db_result is None:
+            return(jsonify({"status": "invalid"}))
+        if not db_result["valid"]:
+            if event is None:
+                return(jsonify({"status": "waiting"}))
+            with serverMetrics.TEMP_POLLING.track_inprogress():
+                approved = event.wait(wait)
+            if not approved:
+                return(jsonify({"status": "waiting"}))
+        return(getConnectDetail(db_result["app"], db_result["cluster"], db_result["task"], db_result["container"]))
+    finally:
+        if event is not None:
+            release_approval(id)
+
+
+def approval_event(uuidRequester):
+    # A client retrying after a dropped connection can poll twice for the same request, they share the event
+    with approvals_lock:
+        approval = approvals.setdefault(uuidRequester, [threading.Event(), 0])
+        approval[1] += 1
+        return(approval[0])
+
+
+def release_approval(uuidRequester):
+    # The event is forgotten when its last poll is done
+    with approvals_lock:
+        approval = approvals.get(uuidRequester)
+        if approval is not None:
+            approval[1] -= 1
+            if approval[1] <= 0:
+                del approvals[uuidRequester]
+
+
+def wake_up(uuidRequester):
+    # Called by the store when a request is validated, by this server or by any other replica
+    with approvals_lock:
+        approval = approvals.get(uuidRequester)
+    if approval is not None:
+        approval[0].set()
+
+
+store.listen(wake_up)
 
 
 #
@@ -302,13 +808,20 @@ def checkTemp(id):
 def validateTemp(id):
     if not verify_access("allow_admin", "admin", auth.current_user()["username"]):
         return(jsonify({"error": "Not_Allowed"}))
-    db_request = Query()
-    db_result = db.search(db_request.uuidValidator == id)
-    db.upsert({'name': db_result[0]["name"], 'app': db_result[0]["app"], 'cluster': db_result[0]["cluster"], 'task': db_result[0]["task"], 'container': db_result[0]["container"], 'uuidValidator': db_result[0]["uuidValidator"], 'uuidRequester':db_result[0]["uuidRequester"], 'valid': True}, db_request.uuidValidator == id)
+    db_result = store.validate(id)
+    if db_result is None:
+        return(jsonify({"status": "invalid"}))
     return(jsonify({"status": "ok"}))
 
 
 def start():
+    vault.check_health()
+    if serverSettings.TEAM_INDEX_ENABLE:
+        team_index.start()
+    if events is not None:
+        events.start()
+    if serverSettings.SEARCH_INDEX_ENABLE:
+        search_index.start()
     app.run(host="0.0.0.0", debug=True)
 
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+from botocore.config import Config
+from dateutil.tz import tzlocal
+import boto3
+import botocore
+import datetime
+import threading
+import serverMetrics
+import serverSettings
+
+BOTO_CONFIG = Config(
+    max_pool_connections=serverSettings.AWS_MAX_POOL_CONNECTIONS,
+    retries={'max_attempts': serverSettings.AWS_MAX_ATTEMPTS, 'mode': serverSettings.AWS_RETRY_MODE}
+)
+
+# boto3 clients are thread safe, but the sessions used to create them are not
+_lock = threading.Lock()
+_base_session = None
+_sessions = {}
+_clients = {}
+
+
+def assumed_role_session(role_arn: str, base_session: botocore.session.Session = None):
+    base_session = base_session or boto3.session.Session()._session
+    fetcher = botocore.credentials.AssumeRoleCredentialFetcher(
+        client_creator=lambda *args, **kwargs: base_session.create_client(*args, **dict(endpoint_args(), **kwargs)),
+        source_credentials=base_session.get_credentials(),
+        role_arn=role_arn,
+        extra_args={}
+    )
+    # Deferred credentials are only fetched on first use, and refreshed by botocore
+    # a few minutes before they expire, so every client of the session share them
+    creds = botocore.credentials.DeferredRefreshableCredentials(
+        method='assume-role',
+        refresh_using=fetcher.fetch_credentials,
+        time_fetcher=lambda: datetime.datetime.now(tzlocal())
+    )
+    botocore_session = botocore.session.Session()
+    botocore_session._credentials = creds
+    return boto3.Session(botocore_session=botocore_session)
+
+
+def endpoint_args():
+    # Given to the clients, so older botocore releases (without AWS_ENDPOINT_URL in the environment) use it too
+    if serverSettings.AWS_ENDPOINT_URL:
+        return({"endpoint_url": serverSettings.AWS_ENDPOINT_URL})
+    return({})
+
+
+def get_session(role_arn):
+    # Must be called with _lock held
+    global _base_session
+    if _base_session is None:
+        _base_session = serverMetrics.instrument_boto(boto3.session.Session())
+    if role_arn == "root":
+        return(_base_session)
+    if role_arn not in _sessions:
+        _sessions[role_arn] = serverMetrics.instrument_boto(assumed_role_session(role_arn, _base_session._session))
+    return(_sessions[role_arn])
+
+
+def get_client(app, service):
+    role_arn = serverSettings.MAP_GROUP[app]["aws"]
+    region = serverSettings.MAP_GROUP[app]["region"]
+    key = (app, role_arn, region, service)
+    client = _clients.get(key)
+    if client is not None:
+        return(client)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = get_session(role_arn).client(service, region_name=region, config=BOTO_CONFIG, **endpoint_args())
+        return(_clients[key])
+
+
+def get_root_client(service, region):
+    # Clients of the account of the server itself, that are not used for an app
+    key = (None, "root", region, service)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = get_session("root").client(service, region_name=region, config=BOTO_CONFIG, **endpoint_args())
+        return(_clients[key])
+
+
+def reset():
+    global _base_session
+    with _lock:
+        _base_session = None
+        _sessions.clear()
+        _clients.clear()
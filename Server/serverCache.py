@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import json
+import threading
+import time
+import serverMetrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+_MISSING = object()
+
+
+def hash_key(value):
+    # Never keep the raw github tokens in memory as keys
+    return(hashlib.sha256(value.encode('utf-8')).hexdigest())
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share a single call of the function, and its result or its exception
+
+    The key is a tuple starting with the name of the operation, the callers joining a running call wait for it at most
+    timeout seconds (the one given to do, or the default one) and get a TimeoutError after that.
+    The result is shared, the callers must not modify it.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, timeout=None):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            serverMetrics.COALESCED_CALLS.labels(key[0]).inc()
+            return(future.result(self.timeout if timeout is None else timeout))
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        with self._lock:
+            return(len(self._calls))
+
+
+_redis_clients = {}
+_redis_lock = threading.Lock()
+
+
+def redis_client(url):
+    # One client (and connection pool) per url, shared by the caches and the request store
+    if redis is None:
+        raise RuntimeError("The redis backend needs the redis package, pip install redis")
+    with _redis_lock:
+        if url not in _redis_clients:
+            _redis_clients[url] = redis.Redis.from_url(url)
+        return(_redis_clients[url])
+
+
+class TTLCache:
+    """Thread safe LRU cache, each entry expire after its own ttl"""
+
+    def __init__(self, maxsize, ttl, name=None):
+        # Hits and misses are counted in the metrics when the cache has a name
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        value = self._get(key)
+        if self.name:
+            serverMetrics.cache_result(self.name, value is not _MISSING)
+        return(default if value is _MISSING else value)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return(_MISSING)
+            value, expire = entry
+            if expire < time.monotonic():
+                del self._data[key]
+                return(_MISSING)
+            self._data.move_to_end(key)
+            return(value)
+
+    def set(self, key, value, ttl=None):
+        expire = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expire)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return(self._get(key) is not _MISSING)
+
+    def __len__(self):
+        with self._lock:
+            return(len(self._data))
+
+
+class RedisCache:
+    """Same interface as TTLCache, but shared by all the server replicas
+
+    Values are stored as json, so they must be made of dict, list, str, numbers and booleans, redis takes care of the
+    expiry and of the eviction (set a maxmemory-policy on the redis server), maxsize is only kept for the interface.
+    """
+
+    def __init__(self, client, name, ttl, maxsize=None, prefix="sshecs:cache:"):
+        self.client = client
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.prefix = prefix + name + ":"
+
+    def _key(self, key):
+        return(self.prefix + (key if isinstance(key, str) else json.dumps(key)))
+
+    def get(self, key, default=None):
+        value = self.client.get(self._key(key))
+        serverMetrics.cache_result(self.name, value is not None)
+        return(default if value is None else json.loads(value))
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.delete(key)
+            return
+        self.client.set(self._key(key), json.dumps(value), px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def __contains__(self, key):
+        return(self.client.exists(self._key(key)) > 0)
+
+    def __len__(self):
+        return(sum(1 for _ in self.client.scan_iter(match=self.prefix + "*")))
+
+
+def open_cache(backend, name, maxsize, ttl, redis_url=None):
+    if backend == "memory":
+        return(TTLCache(maxsize, ttl, name=name))
+    if backend == "redis":
+        return(RedisCache(redis_client(redis_url), name, ttl, maxsize))
+    raise ValueError("Unknown cache backend " + backend)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import threading
+import time
+import serverAws
+import serverSettings
+
+TASK_STATE_CHANGE = "ECS Task State Change"
+INSTANCE_STATE_CHANGE = "ECS Container Instance State Change"
+
+
+class SqsEventSource:
+    """ECS events sent to a SQS queue by an EventBridge rule, the messages are deleted once applied"""
+
+    def __init__(self, client, queue_url, wait=20):
+        self.client = client
+        self.queue_url = queue_url
+        self.wait = wait
+
+    def receive(self):
+        response = self.client.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=self.wait)
+        return([(json.loads(message["Body"]), message["ReceiptHandle"]) for message in response.get("Messages", [])])
+
+    def ack(self, handle):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=handle)
+
+
+class FileEventSource:
+    """Stand-in for the queue: the events are json lines appended to a file"""
+
+    def __init__(self, path, wait=1):
+        self.path = path
+        self.wait = wait
+        self._offset = 0
+
+    def receive(self):
+        if os.path.isfile(self.path):
+            with open(self.path) as fp:
+                fp.seek(self._offset)
+                lines = fp.readlines()
+            # Keep a line still being written for the next time
+            if lines and not lines[-1].endswith("\n"):
+                lines.pop()
+            self._offset += sum(len(line.encode()) for line in lines)
+            events = [(json.loads(line), None) for line in lines if line.strip()]
+            if events:
+                return(events)
+        time.sleep(self.wait)
+        return([])
+
+    def ack(self, handle):
+        pass
+
+
+class EventConsumer:
+    """Apply the events of a source with a handler, from a background thread"""
+
+    def __init__(self, source, handler):
+        self.source = source
+        self.handler = handler
+        self._thread = None
+
+    def poll(self):
+        # Apply the events available now, return how many there were
+        events = self.source.receive()
+        for event, handle in events:
+            try:
+                self.handler(event)
+            except Exception as e:
+                print("[Warning] could not apply the ecs event " + str(event.get("id")) + ": " + str(e))
+            self.source.ack(handle)
+        return(len(events))
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print("[Warning] could not read the ecs events: " + str(e))
+                time.sleep(5)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ecs-events", daemon=True)
+            self._thread.start()
+
+
+def task_summary(task):
+    # The fields of a task we use, from describe_tasks or from an event, small and json friendly for the caches
+    return({
+        "taskArn": task["taskArn"],
+        "group": task.get("group", ""),
+        "lastStatus": task.get("lastStatus"),
+        "desiredStatus": task.get("desiredStatus"),
+        "containerInstanceArn": task.get("containerInstanceArn"),
+        "version": task.get("version", 0),
+        "containers": [{
+            "containerArn": container["containerArn"],
+            "name": container["name"],
+            "runtimeId": container.get("runtimeId", ""),
+            "lastStatus": container.get("lastStatus")
+        } for container in task.get("containers", [])]
+    })
+
+
+def apps_of_cluster(cluster_arn):
+    # The apps of MAP_GROUP with this cluster, in the region of the event
+    region = cluster_arn.split(":")[3]
+    cluster = cluster_arn.split("/")[-1]
+    return([app for app, config in serverSettings.MAP_GROUP.items() if cluster in config and config.get("region") == region])
+
+
+def from_settings(handler):
+    if serverSettings.EVENTS_SOURCE == "sqs":
+        client = serverAws.get_root_client('sqs', serverSettings.EVENTS_QUEUE_REGION)
+        source = SqsEventSource(client, serverSettings.EVENTS_QUEUE_URL)
+    elif serverSettings.EVENTS_SOURCE == "file":
+        source = FileEventSource(serverSettings.EVENTS_FILE)
+    else:
+        raise ValueError("Unknown events source " + serverSettings.EVENTS_SOURCE)
+    return(EventConsumer(source, handler))
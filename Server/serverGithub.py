@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+import time
+import requests
+import serverCache
+import serverMetrics
+import serverSettings
+
+GithubResponse = namedtuple('GithubResponse', ['status_code', 'data', 'next', 'cached'])
+
+
+class GithubClient:
+    """Pooled session to the github api, asking with If-None-Match for the answers it already has
+
+    github does not count the 304 answers in the rate limit. When a token has less than low_budget calls left before
+    its reset, or when github fails, the answers kept in the cache are used without asking github.
+    """
+
+    def __init__(self, url, org, admin_token, cache=None, low_budget=100, pool_size=10, timeout=5):
+        self.url = url.rstrip('/')
+        self.org = org
+        self.admin_token = admin_token
+        self.cache = cache
+        self.low_budget = low_budget
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # hash of the token -> (remaining calls, reset time), from the X-RateLimit headers
+        self._budgets = serverCache.TTLCache(4096, 3600)
+
+    def budget(self, token):
+        remaining, reset = self._budgets.get(serverCache.hash_key(token), (None, 0))
+        if reset < time.time():
+            return(None)
+        return(remaining)
+
+    def _track_budget(self, token, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        self._budgets.set(serverCache.hash_key(token), (int(remaining), int(reset)))
+        if token == self.admin_token:
+            serverMetrics.GITHUB_BUDGET.set(int(remaining))
+
+    def get(self, operation, path, token=None):
+        token = token or self.admin_token
+        url = path if path.startswith('http') else self.url + path
+        key = serverCache.hash_key(token + ' ' + url)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            budget = self.budget(token)
+            if budget is not None and budget <= self.low_budget:
+                serverMetrics.GITHUB_DEGRADED.labels(operation).inc()
+                return(GithubResponse(cached['status'], cached['data'], cached['next'], True))
+        headers = {'Authorization': 'token ' + token}
+        if cached is not None and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        try:
+            with serverMetrics.upstream('github', operation) as call:
+                response = call.check(self.session.get(url, headers=headers, timeout=self.timeout))
+        except requests.exceptions.RequestException:
+            if cached is None:
+                raise
+            serverMetrics.GITHUB_DEGRADED.labels(operation).inc()
+            return(GithubResponse(cached['status'], cached['data'], cached['next'], True))
+        self._track_budget(token, response)
+        if response.status_code == 304 and cached is not None:
+            self.cache.set(key, cached)
+            return(GithubResponse(cached['status'], cached['data'], cached['next'], True))
+        if cached is not None and (response.status_code >= 500 or response.status_code in (403, 429)):
+            # Github is down or we are rate limited, the last answer is better than nothing
+            serverMetrics.GITHUB_DEGRADED.labels(operation).inc()
+            return(GithubResponse(cached['status'], cached['data'], cached['next'], True))
+        data = response.json() if response.content else None
+        next_url = response.links.get('next', {}).get('url')
+        if self.cache is not None and response.status_code in (200, 204, 404):
+            self.cache.set(key, {'etag': response.headers.get('ETag'), 'status': response.status_code, 'data': data, 'next': next_url})
+        return(GithubResponse(response.status_code, data, next_url, False))
+
+    def user(self, token):
+        # The github user of the token, or None if the token is not valid
+        response = self.get('user', '/user', token)
+        if response.status_code != 200:
+            return(None)
+        return(response.data)
+
+    def is_org_member(self, username):
+        return(self.get('org-member', '/orgs/' + self.org + '/members/' + username).status_code == 204)
+
+    def is_team_member(self, team, username):
+        return(self.get('team-membership', '/orgs/' + self.org + '/teams/' + team + '/memberships/' + username).status_code == 200)
+
+    def team_members(self, team):
+        members = set()
+        path = '/orgs/' + self.org + '/teams/' + team + '/members?per_page=100'
+        while path:
+            response = self.get('team-members', path)
+            if response.status_code != 200:
+                raise RuntimeError("github answered " + str(response.status_code) + " for the members of " + team)
+            members.update(member["login"].lower() for member in response.data)
+            path = response.next
+        return(members)
+
+
+def from_settings():
+    cache = None
+    if serverSettings.CACHE_ENABLE:
+        cache = serverCache.open_cache(serverSettings.CACHE_BACKEND, "github", serverSettings.GITHUB_CACHE_SIZE,
+                                       serverSettings.GITHUB_CACHE_TTL, serverSettings.REDIS_URL)
+    return(GithubClient(serverSettings.GITHUB_API, serverSettings.GITHUB_ORG, serverSettings.GITHUB_ADMIN_TOKEN, cache=cache,
+                        low_budget=serverSettings.GITHUB_LOW_BUDGET, pool_size=serverSettings.GITHUB_POOL_SIZE,
+                        timeout=serverSettings.GITHUB_TIMEOUT))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+REQUEST_DURATION = Histogram('sshecs_request_duration_seconds', 'Time spent answering the requests', ['route', 'method', 'status'])
+UPSTREAM_DURATION = Histogram('sshecs_upstream_duration_seconds', 'Time spent in the github, aws and vault calls',
+                              ['dependency', 'operation'])
+UPSTREAM_ERRORS = Counter('sshecs_upstream_errors_total', 'Failed github, aws and vault calls', ['dependency', 'operation'])
+CACHE_HITS = Counter('sshecs_cache_hits_total', 'Values found in the in memory caches', ['cache'])
+CACHE_MISSES = Counter('sshecs_cache_misses_total', 'Values missing or expired in the in memory caches', ['cache'])
+COALESCED_CALLS = Counter('sshecs_coalesced_calls_total', 'Calls that used the result of the same call made by an other request',
+                          ['operation'])
+GITHUB_BUDGET = Gauge('sshecs_github_ratelimit_remaining', 'Calls left to the admin github token before the rate limit reset')
+GITHUB_DEGRADED = Counter('sshecs_github_degraded_total', 'Github answers served from the cache because of the rate limit or of a failure',
+                          ['operation'])
+TEMP_PENDING = Gauge('sshecs_temp_requests_pending', 'Temporary access requests waiting for an admin')
+TEMP_POLLING = Gauge('sshecs_temp_requests_polling', 'Clients waiting on /checktemp for their temporary access')
+
+
+class upstream:
+    """Time the call made in the with block, errors are the exceptions and the failed responses given to check()
+
+    with serverMetrics.upstream('github', 'user') as call:
+        response = call.check(requests.get(...))
+    """
+
+    def __init__(self, dependency, operation):
+        self.labels = (dependency, operation)
+        self.error = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return(self)
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_DURATION.labels(*self.labels).observe(time.perf_counter() - self.started)
+        if exc_type is not None or self.error:
+            UPSTREAM_ERRORS.labels(*self.labels).inc()
+
+    def check(self, response):
+        # A 404 from github only means "not a member", only the server errors and the throttling are failures
+        if response.status_code >= 500 or response.status_code == 429:
+            self.error = True
+        return(response)
+
+
+def cache_result(cache, hit):
+    (CACHE_HITS if hit else CACHE_MISSES).labels(cache).inc()
+
+
+def _boto_before_call(model, context, **kwargs):
+    context['metrics'] = (model.service_model.service_name, model.name, time.perf_counter())
+
+
+def _boto_after_call(http_response, context, **kwargs):
+    # Stubbed clients answer before our handler is called, there is nothing to record
+    if 'metrics' not in context:
+        return
+    dependency, operation, started = context['metrics']
+    UPSTREAM_DURATION.labels(dependency, operation).observe(time.perf_counter() - started)
+    if http_response.status_code >= 400:
+        UPSTREAM_ERRORS.labels(dependency, operation).inc()
+
+
+def _boto_after_call_error(exception, context, **kwargs):
+    # Connection errors and timeouts, once botocore gave up retrying
+    if 'metrics' not in context:
+        return
+    dependency, operation, started = context['metrics']
+    UPSTREAM_DURATION.labels(dependency, operation).observe(time.perf_counter() - started)
+    UPSTREAM_ERRORS.labels(dependency, operation).inc()
+
+
+def instrument_boto(session):
+    # Every client created from the session after this is timed, even the sts client used to assume roles
+    session.events.register('before-call', _boto_before_call)
+    session.events.register('after-call', _boto_after_call)
+    session.events.register('after-call-error', _boto_after_call_error)
+    return(session)
+
+
+def render():
+    return(generate_latest(), CONTENT_TYPE_LATEST)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import serverSettings
+
+
+def all_clusters():
+    return([(app, cluster) for app, clusters in serverSettings.MENU.items() for cluster in clusters])
+
+
+def match_entry(query, entry):
+    # Which field of the container match the query: service, container or image names, or private ip
+    query = query.lower()
+    if query in entry["service"].lower():
+        return("service")
+    if query in entry["containerName"].lower():
+        return("container")
+    if query in entry["image"].lower():
+        return("image")
+    if any(ip.startswith(query) for ip in entry["ips"]):
+        return("ip")
+    return(None)
+
+
+class SearchIndex:
+    """In memory index of the running containers of every cluster of the menu, rebuilt in background
+
+    build(app, cluster) returns the containers of a cluster, dict with the keys app, cluster, service, task,
+    container, containerName, image and ips. A cluster missing from the index, or older than max_age, is built
+    when it is searched, once for all the searches asking for it at the same time when flights is given.
+    """
+
+    def __init__(self, build, refresh=300, max_age=900, workers=8, flights=None):
+        self.build = build
+        self.flights = flights
+        self.refresh_interval = refresh
+        self.max_age = max_age
+        # Clusters are in different regions and accounts, they are all built at the same time
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self._clusters = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _build(self, app, cluster):
+        if self.flights is not None:
+            return(self.flights.do(("search-index", app, cluster), self._load, app, cluster))
+        return(self._load(app, cluster))
+
+    def _load(self, app, cluster):
+        entries = self.build(app, cluster)
+        with self._lock:
+            self._clusters[(app, cluster)] = (entries, time.monotonic())
+        return(entries)
+
+    def entries(self, app, cluster):
+        with self._lock:
+            entry = self._clusters.get((app, cluster))
+        if entry is not None and time.monotonic() - entry[1] <= self.max_age:
+            return(entry[0])
+        return(self._build(app, cluster))
+
+    def refresh(self):
+        futures = {key: self.pool.submit(self._build, *key) for key in all_clusters()}
+        for (app, cluster), future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                # Keep the previous containers, they will go stale if aws keeps failing
+                print("[Warning] could not index " + app + " - " + cluster + ": " + str(e))
+
+    def search(self, query, clusters, limit=100):
+        # Return the matching containers of the clusters, and the clusters that could not be searched
+        futures = [(key, self.pool.submit(self.entries, *key)) for key in clusters]
+        results = list()
+        errors = list()
+        for (app, cluster), future in futures:
+            try:
+                entries = future.result()
+            except Exception as e:
+                print("[Warning] could not search " + app + " - " + cluster + ": " + str(e))
+                errors.append(app + "/" + cluster)
+                continue
+            for entry in entries:
+                matched = match_entry(query, entry)
+                if matched:
+                    results.append(dict(entry, matched=matched))
+        results.sort(key=lambda result: (result["app"], result["cluster"], result["service"], result["task"], result["containerName"]))
+        return(results[:limit], errors)
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+            self._thread.start()
@@ -1,15 +1,108 @@
 # Update this to force your clients to update (you will need to change the version in the client too)
-VERSION = 1.2
+VERSION = 1.3
 
-# Enable requests cache, to cache response from the github API, it speed things up
+# Keep the github answers and their etags, github is then asked with conditional requests that do not use the rate limit
 CACHE_ENABLE = True
+# How many github tokens we keep in memory once checked, and for how long (seconds)
+AUTH_CACHE_SIZE = 1024
+AUTH_CACHE_TTL = 300
+# How long we remember a token that failed the login or the org check (seconds)
+AUTH_CACHE_NEGATIVE_TTL = 30
+# Keep the members of every team listed in MAP_GROUP in memory, instead of asking github on each connection
+TEAM_INDEX_ENABLE = True
+# How often the team members are reloaded, and after how long we stop trusting them (seconds)
+TEAM_INDEX_REFRESH = 300
+TEAM_INDEX_MAX_AGE = 900
+# How long the list of services of a cluster is kept in memory (seconds), and for how many clusters
+SERVICES_CACHE_TTL = 15
+SERVICES_CACHE_SIZE = 256
+# How long the clients use their copy of the services of a cluster without asking the server (seconds)
+# Keep it short, the server caches (and events) keep the services up to date, not the clients
+SERVICES_MAX_AGE = 15
+# How long the container instance -> private ip mapping of a cluster is kept in memory (seconds)
+# An instance missing from the mapping always trigger a reload of the cluster
+INSTANCES_CACHE_TTL = 600
+INSTANCES_CACHE_SIZE = 256
+# How long the running tasks of a service, and the containers of a task, are kept in memory (seconds)
+# 0 disable it, use a long one with EVENTS_ENABLE
+TASKS_CACHE_TTL = 0
+TASKS_CACHE_SIZE = 4096
+# Update the services, tasks and instances caches from the ECS state change events, so they can have long TTLs
+# The events are read from a SQS queue ("sqs"), fed by an EventBridge rule on the "ECS Task State Change" and
+# "ECS Container Instance State Change" events of your clusters, or from a json lines file ("file") for tests
+# Each server needs its own queue if the caches are in memory, one queue is enough with the redis backend
+EVENTS_ENABLE = False
+EVENTS_SOURCE = "sqs"
+EVENTS_QUEUE_URL = "https://sqs.eu-west-1.amazonaws.com/123456789012/ssh-ecs-events"
+EVENTS_QUEUE_REGION = "eu-west-1"
+EVENTS_FILE = "ecs-events.jsonl"
+# The running containers of every cluster of the menu are indexed for /search, rebuilt every SEARCH_INDEX_REFRESH seconds
+# A cluster older than SEARCH_INDEX_MAX_AGE is rebuilt when it is searched
+SEARCH_INDEX_ENABLE = True
+SEARCH_INDEX_REFRESH = 300
+SEARCH_INDEX_MAX_AGE = 900
+# Number of clusters indexed at the same time, and max number of containers returned by a search
+SEARCH_WORKERS = 8
+SEARCH_MAX_RESULTS = 100
+# Max number of github and aws calls running at the same time for all the requests
+UPSTREAM_WORKERS = 32
+# Identical aws and github calls asked by several requests at the same time are made only once, the other requests
+# wait for its result at most this time (seconds)
+SINGLEFLIGHT_TIMEOUT = 30
+# Max time a client can wait on /checktemp for an admin to accept its temporary access (seconds)
+CHECKTEMP_MAX_WAIT = 30
+# Where the auth, team, services and instances caches live: "memory" (one server) or "redis" (shared by several replicas)
+CACHE_BACKEND = "memory"
+# Redis server used by the "redis" backends
+REDIS_URL = "redis://localhost:6379/0"
+# Where the temporary access requests are stored: "sqlite" (one server) or "redis" (shared by several replicas)
+# An existing db.json from older versions is imported at startup
+STORE_BACKEND = "sqlite"
+STORE_PATH = "requests.db"
+# Temporary access requests are forgotten after this time (seconds)
+STORE_TTL = 3600
+# How long the clients can use the menu they saved on disk without asking the server again (seconds)
+MENU_MAX_AGE = 300
+# Answers bigger than this are gzipped for the clients supporting it (bytes)
+GZIP_MIN_SIZE = 1024
+# Expose the prometheus metrics on /metrics, protected by this bearer token if it is not empty
+METRICS_ENABLE = True
+METRICS_TOKEN = ""
 # Do you want to log the connection to datadog ? Do it here
 LOG_DATADOG = True
 
+# Size of the connection pool kept open for each AWS client (ecs, ec2), raise it if you have a lot of users
+AWS_MAX_POOL_CONNECTIONS = 20
+# Retry settings for the AWS api calls, adaptive mode slow things down when ECS start to throttle us
+AWS_MAX_ATTEMPTS = 5
+AWS_RETRY_MODE = "adaptive"
+# Send every AWS call (ecs, ec2, sts, sqs) to this url instead of AWS, only for the tests and the benchmarks
+AWS_ENDPOINT_URL = None
+
+# Github api url, change it if you use github enterprise
+GITHUB_API = "https://api.github.com"
+# Max number of github answers kept, and for how long (seconds)
+GITHUB_CACHE_SIZE = 4096
+GITHUB_CACHE_TTL = 86400
+# Under this number of calls left in the rate limit, the cached github answers are used without asking github
+GITHUB_LOW_BUDGET = 100
+# Number of connections kept open to github, and timeout (seconds)
+GITHUB_POOL_SIZE = 10
+GITHUB_TIMEOUT = 5
 # Name of your github org
 GITHUB_ORG = "My-Org"
 # Main user token to check github groups of user (need read on admin:org)
 GITHUB_ADMIN_TOKEN = "token"
+# The datadog logs and slack messages are sent in background, this is the max number of messages waiting to be sent
+SHIPPER_QUEUE_SIZE = 1000
+# Max number of datadog logs sent in a single call
+SHIPPER_BATCH_SIZE = 50
+# How many times we retry a failed message (with backoff), and the timeout of each try (seconds)
+SHIPPER_RETRIES = 3
+SHIPPER_TIMEOUT = 5
+# What to do with new messages when the queue is full: "drop" them, or "spill" them to a file, sent again at next startup
+SHIPPER_FULL_POLICY = "spill"
+SHIPPER_SPILL_PATH = "shipper-spill.jsonl"
 # If you want to log to datadog, http intake url v1 here.
 DATADOG_URL = "https://http-intake.logs.datadoghq.eu/v1/input/KEY"
 # Where to send the "Blabla want to access xx env" message in slack
@@ -20,6 +113,9 @@ VAULT_ADDR = "https://vault.my.website"
 VAULT_TOKEN = "token"
 # Path to the OTP vault secret engine
 VAULT_SECRET = "ssh/creds/otp_key_role"
+# Number of connections kept open to vault (also the max number of OTPs asked at the same time), and timeout (seconds)
+VAULT_POOL_SIZE = 10
+VAULT_TIMEOUT = 5
 
 # The menu to display to your users
 # First key is the product
@@ -65,7 +161,7 @@ MAP_GROUP = {
       "pp-srv2": [
           "srv2-dev",
           "devops"
-      ]
+      ],
       "prod-srv2": [
           "devops"
       ]
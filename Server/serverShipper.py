@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import queue
+import threading
+import time
+import requests
+import serverMetrics
+from urllib.parse import urlsplit
+
+
+class Shipper:
+    """Send the datadog logs and slack messages from a background thread, so requests only enqueue them"""
+
+    def __init__(self, maxsize=1000, batch_size=50, retries=3, timeout=5, full_policy="drop", spill_path=None, session=None):
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.retries = retries
+        self.timeout = timeout
+        self.full_policy = full_policy
+        self.spill_path = spill_path and os.path.abspath(spill_path)
+        self.session = session or requests.Session()
+        self.backoff = 0.5
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def send(self, url, payload, batch=False):
+        # batch=True when the endpoint accept a json list of payloads, like the datadog intake
+        self.start()
+        item = {"url": url, "payload": payload, "batch": batch}
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self._overflow([item])
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="shipper", daemon=True)
+            self._thread.start()
+        self._replay()
+
+    def flush(self, timeout=5):
+        # Called on shutdown, deliver what is in the queue and stop the worker
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        left = list()
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                left.append(item)
+        if left:
+            self._overflow(left)
+
+    def _overflow(self, items):
+        if self.full_policy == "spill" and self.spill_path:
+            with self._lock:
+                with open(self.spill_path, 'a') as fp:
+                    for item in items:
+                        fp.write(json.dumps(item) + "\n")
+        else:
+            print("[Warning] shipper queue is full, dropping " + str(len(items)) + " message(s)")
+
+    def _replay(self):
+        # Put back in the queue what was spilled to disk by a previous run or a full queue
+        if not self.spill_path or not os.path.isfile(self.spill_path):
+            return
+        with self._lock:
+            with open(self.spill_path) as fp:
+                lines = fp.readlines()
+            os.remove(self.spill_path)
+        for line in lines:
+            self.send(**json.loads(line))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            items = [item]
+            stop = False
+            while len(items) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                items.append(item)
+            self._deliver(items)
+            if stop:
+                return
+
+    def _deliver(self, items):
+        batches = dict()
+        for item in items:
+            if item["batch"]:
+                batches.setdefault(item["url"], []).append(item["payload"])
+            else:
+                self._post(item["url"], item["payload"])
+        for url, payloads in batches.items():
+            self._post(url, payloads)
+
+    def _post(self, url, payload):
+        for attempt in range(self.retries + 1):
+            try:
+                with serverMetrics.upstream('shipper', urlsplit(url).netloc) as call:
+                    call.check(self.session.post(url, json=payload, timeout=self.timeout))
+                if not call.error:
+                    return(True)
+            except requests.exceptions.RequestException:
+                pass
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        # The keys are in the urls, only show the host
+        print("[Warning] could not deliver message to " + urlsplit(url).netloc)
+        return(False)
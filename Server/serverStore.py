@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+from abc import ABC, abstractmethod
+import json
+import os
+import sqlite3
+import threading
+import time
+import serverCache
+
+
+class RequestStore(ABC):
+    """Where the temporary access requests live, records are dict with the keys of FIELDS plus valid and created"""
+
+    FIELDS = ('name', 'app', 'cluster', 'task', 'container', 'uuidValidator', 'uuidRequester')
+    _listeners = ()
+
+    @abstractmethod
+    def add(self, record, valid=False):
+        """Keep a new request, already validated when valid is True"""
+
+    @abstractmethod
+    def get_by_requester(self, uuidRequester):
+        """The request of this requester, None if it does not exist or is expired"""
+
+    @abstractmethod
+    def validate(self, uuidValidator):
+        """Mark the request as valid, return it or None if it does not exist"""
+
+    @abstractmethod
+    def count_waiting(self):
+        """Number of requests not validated yet, and not expired"""
+
+    def listen(self, callback):
+        # callback(uuidRequester) is called when a request is validated, on this server or on any other replica
+        self._listeners = self._listeners + (callback,)
+
+    def notify(self, uuidRequester):
+        for callback in self._listeners:
+            callback(uuidRequester)
+
+    @abstractmethod
+    def compact(self):
+        """Forget the expired requests"""
+
+    def import_tinydb(self, path):
+        # One time import of the db.json file used by older servers, the file is renamed once done
+        with open(path) as fp:
+            content = json.load(fp)
+        count = 0
+        for table in content.values():
+            for record in table.values():
+                self.add(dict(record, created=time.time()), valid=record.get('valid', False))
+                count += 1
+        os.rename(path, path + '.imported')
+        return(count)
+
+
+class SqliteRequestStore(RequestStore):
+
+    def __init__(self, path, ttl, compact_interval=300):
+        self.path = os.path.abspath(path)
+        self.ttl = ttl
+        self.compact_interval = compact_interval
+        self._last_compact = 0
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS requests (
+                name TEXT, app TEXT, cluster TEXT, task TEXT, container TEXT,
+                uuidValidator TEXT NOT NULL UNIQUE, uuidRequester TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL DEFAULT 'waiting', created REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS requests_created ON requests (created)')
+
+    def _connection(self):
+        # sqlite connections can not be shared between threads, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return(conn)
+
+    def _record(self, row):
+        if row is None:
+            return(None)
+        record = {field: row[field] for field in self.FIELDS}
+        record['valid'] = row['status'] == 'valid'
+        record['created'] = row['created']
+        return(record)
+
+    def add(self, record, valid=False):
+        values = [record[field] for field in self.FIELDS]
+        values += ['valid' if valid else 'waiting', record.get('created', time.time())]
+        with self._connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO requests '
+                         '(name, app, cluster, task, container, uuidValidator, uuidRequester, status, created) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', values)
+        if time.time() - self._last_compact > self.compact_interval:
+            self.compact()
+
+    def get_by_requester(self, uuidRequester):
+        row = self._connection().execute('SELECT * FROM requests WHERE uuidRequester = ? AND created > ?',
+                                         (uuidRequester, time.time() - self.ttl)).fetchone()
+        return(self._record(row))
+
+    def validate(self, uuidValidator):
+        with self._connection() as conn:
+            conn.execute("UPDATE requests SET status = 'valid' WHERE uuidValidator = ? AND created > ?",
+                         (uuidValidator, time.time() - self.ttl))
+            row = conn.execute('SELECT * FROM requests WHERE uuidValidator = ? AND created > ?',
+                               (uuidValidator, time.time() - self.ttl)).fetchone()
+        record = self._record(row)
+        if record is not None:
+            self.notify(record['uuidRequester'])
+        return(record)
+
+    def count_waiting(self):
+        row = self._connection().execute("SELECT COUNT(*) FROM requests WHERE status = 'waiting' AND created > ?",
+                                         (time.time() - self.ttl,)).fetchone()
+        return(row[0])
+
+    def compact(self):
+        self._last_compact = time.time()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM requests WHERE created <= ?', (time.time() - self.ttl,))
+
+
+class RedisRequestStore(RequestStore):
+    """Requests shared by all the server replicas, the validations are sent to every replica with pub/sub"""
+
+    def __init__(self, client, ttl, prefix="sshecs:requests:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._thread = None
+
+    def _key(self, kind, uuid):
+        return(self.prefix + kind + ":" + uuid)
+
+    def add(self, record, valid=False):
+        record = {field: record[field] for field in self.FIELDS + ('created',) if field in record}
+        record.setdefault('created', time.time())
+        ttl = int(record['created'] + self.ttl - time.time())
+        if ttl <= 0:
+            return
+        record['valid'] = valid
+        pipe = self.client.pipeline()
+        # nx, like the unique uuid columns of the sqlite store
+        pipe.set(self._key('requester', record['uuidRequester']), json.dumps(record), ex=ttl, nx=True)
+        pipe.set(self._key('validator', record['uuidValidator']), record['uuidRequester'], ex=ttl, nx=True)
+        if not valid:
+            pipe.zadd(self.prefix + 'waiting', {record['uuidRequester']: record['created']})
+        pipe.zremrangebyscore(self.prefix + 'waiting', '-inf', time.time() - self.ttl)
+        pipe.execute()
+
+    def get_by_requester(self, uuidRequester):
+        record = self.client.get(self._key('requester', uuidRequester))
+        return(None if record is None else json.loads(record))
+
+    def validate(self, uuidValidator):
+        uuidRequester = self.client.get(self._key('validator', uuidValidator))
+        if uuidRequester is None:
+            return(None)
+        uuidRequester = uuidRequester.decode()
+        key = self._key('requester', uuidRequester)
+        record = self.client.get(key)
+        if record is None:
+            return(None)
+        record = dict(json.loads(record), valid=True)
+        pipe = self.client.pipeline()
+        pipe.set(key, json.dumps(record), xx=True, keepttl=True)
+        pipe.zrem(self.prefix + 'waiting', uuidRequester)
+        pipe.publish(self.prefix + 'validated', uuidRequester)
+        pipe.execute()
+        return(record)
+
+    def count_waiting(self):
+        return(self.client.zcount(self.prefix + 'waiting', time.time() - self.ttl, '+inf'))
+
+    def compact(self):
+        # The records expire by themselves, only the waiting index needs cleaning
+        self.client.zremrangebyscore(self.prefix + 'waiting', '-inf', time.time() - self.ttl)
+
+    def listen(self, callback):
+        super().listen(callback)
+        if self._thread is None:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.prefix + 'validated': lambda message: self.notify(message['data'].decode())})
+            self._thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+def open_store(backend, path, ttl, redis_url=None):
+    if backend == "sqlite":
+        return(SqliteRequestStore(path, ttl))
+    if backend == "redis":
+        return(RedisRequestStore(serverCache.redis_client(redis_url), ttl))
+    raise ValueError("Unknown request store backend " + backend)
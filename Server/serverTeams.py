@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+import serverCache
+import serverSettings
+
+
+def all_teams():
+    teams = set()
+    for app in serverSettings.MAP_GROUP.values():
+        for groups in app.values():
+            if isinstance(groups, list):
+                teams.update(groups)
+    return(teams)
+
+
+class TeamIndex:
+    """team -> members index of every team used in MAP_GROUP, refreshed in background
+
+    fetch(team) returns the members of the team, they are kept in a cache for max_age seconds,
+    pass a shared cache to share the index between replicas.
+    """
+
+    def __init__(self, refresh=300, max_age=900, fetch=None, cache=None):
+        self.refresh_interval = refresh
+        self.max_age = max_age
+        self.fetch = fetch
+        self.cache = cache if cache is not None else serverCache.TTLCache(1024, max_age)
+        # team -> (refresh time, set of the members), so a check does not scan the list kept in the cache
+        self._members = {}
+        self._thread = None
+
+    def refresh(self):
+        for team in all_teams():
+            try:
+                members = self.fetch(team)
+            except Exception as e:
+                # Keep the previous members, they will go stale if github keeps failing
+                print("[Warning] could not load members of team " + team + ": " + str(e))
+                continue
+            self.cache.set(team, {"refreshed": time.time(), "members": sorted(members)}, ttl=self.max_age)
+
+    def is_member(self, team, username):
+        # True / False when the index knows the team, None when we need to ask github
+        cached = self.cache.get(team)
+        if cached is None:
+            return(None)
+        refreshed, members = self._members.get(team, (None, None))
+        if refreshed != cached["refreshed"]:
+            members = frozenset(cached["members"])
+            self._members[team] = (cached["refreshed"], members)
+        return(username.lower() in members)
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="team-index", daemon=True)
+            self._thread.start()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ThreadPoolExecutor
+import hvac
+import requests
+import serverMetrics
+import serverSettings
+
+
+class VaultClient:
+    """One long lived vault client per process, keeping its connections to vault open between OTPs"""
+
+    def __init__(self, url, token, secret, pool_size=10, timeout=5, verify=False):
+        self.secret = secret
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        # hvac clients are not documented as thread safe, but only the shared session is used when writing
+        self.client = hvac.Client(url=url, token=token, verify=verify, timeout=timeout, session=session)
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="vault")
+
+    def check_health(self):
+        try:
+            with serverMetrics.upstream('vault', 'lookup-self'):
+                authenticated = self.client.is_authenticated()
+            if authenticated:
+                return(True)
+            print("[Warning] vault token is not valid")
+        except Exception as e:
+            print("[Warning] could not reach vault: " + str(e))
+        return(False)
+
+    def issue_otp(self, ip):
+        with serverMetrics.upstream('vault', 'otp'):
+            return(self.client.write(self.secret, ip=ip)["data"]["key"])
+
+    def issue_otps(self, ips):
+        # One OTP per ip in the list, in the same order, all asked at the same time
+        return(list(self._pool.map(self.issue_otp, ips)))
+
+
+def from_settings():
+    return(VaultClient(serverSettings.VAULT_ADDR, serverSettings.VAULT_TOKEN, serverSettings.VAULT_SECRET,
+                       pool_size=serverSettings.VAULT_POOL_SIZE, timeout=serverSettings.VAULT_TIMEOUT))
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, 'benchmarks'))
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    import serverSettings
+    serverSettings.CACHE_ENABLE = False
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'test')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'test')
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    try:
+        spec = importlib.util.spec_from_file_location("server_http", os.path.join(SERVER_DIR, "server-http.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
@@ -0,0 +1,24 @@
+import time
+
+
+def test_verify_access_checks_teams_in_parallel(server, monkeypatch):
+    def check(team, username):
+        time.sleep(0.2)
+        return team == "devops"
+
+    monkeypatch.setattr(server.github, "is_team_member", check)
+    monkeypatch.setattr(server.team_index, "is_member", lambda team, username: None)
+    start = time.monotonic()
+    assert server.verify_access("Service 2", "uat-srv2", "alice")
+    assert time.monotonic() - start < 0.5
+
+
+def test_verify_access_uses_team_index(server, monkeypatch):
+    def check(team, username):
+        raise AssertionError("github should not be called")
+
+    monkeypatch.setattr(server.github, "is_team_member", check)
+    monkeypatch.setattr(server.team_index, "is_member", lambda team, username: team == "devops")
+    assert server.verify_access("Service 2", "uat-srv2", "alice")
+    monkeypatch.setattr(server.team_index, "is_member", lambda team, username: False)
+    assert not server.verify_access("Service 2", "uat-srv2", "alice")
@@ -0,0 +1,33 @@
+import serverAws
+import serverSettings
+
+
+def setup_function():
+    serverAws.reset()
+
+
+def test_clients_are_reused(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    client = serverAws.get_client("Service 1", 'ecs')
+    assert serverAws.get_client("Service 1", 'ecs') is client
+    assert serverAws.get_client("Service 1", 'ec2') is not client
+    assert client.meta.region_name == serverSettings.MAP_GROUP["Service 1"]["region"]
+
+
+def test_assumed_sessions_are_shared(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    ecs = serverAws.get_client("Service 2", 'ecs')
+    ec2 = serverAws.get_client("Service 2", 'ec2')
+    assert len(serverAws._sessions) == 1
+    assert ecs._request_signer._credentials is ec2._request_signer._credentials
+
+
+def test_endpoint_url(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    monkeypatch.delenv('AWS_ENDPOINT_URL', raising=False)
+    monkeypatch.setattr(serverSettings, "AWS_ENDPOINT_URL", "http://127.0.0.1:4566")
+    assert serverAws.get_client("Service 2", 'ecs').meta.endpoint_url == "http://127.0.0.1:4566"
+    assert serverAws.get_root_client('sqs', 'eu-west-1').meta.endpoint_url == "http://127.0.0.1:4566"
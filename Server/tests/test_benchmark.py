@@ -0,0 +1,13 @@
+import latency
+
+
+def test_latency_benchmark_runs():
+    results = latency.run(iterations=4, clients=2, services=12, tasks=2)
+    endpoints = results["endpoints"]
+    assert sorted(endpoints) == sorted(latency.ENDPOINTS)
+    for result in endpoints.values():
+        assert 0 < result["p50"] <= result["p95"] <= result["p99"]
+    # Logins and the services list come from the caches once warm
+    assert endpoints["/menu"]["upstream_calls"] == {}
+    assert endpoints["/services"]["upstream_calls"] == {}
+    assert endpoints["/connect"]["upstream_calls"]["vault:otp"] == 1
@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import serverCache
+
+
+def test_ttl_expiry():
+    cache = serverCache.TTLCache(10, 60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert "b" not in cache
+
+
+def test_lru_eviction():
+    cache = serverCache.TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_falsy_values_are_cached():
+    cache = serverCache.TTLCache(2, 60)
+    cache.set("a", False)
+    assert cache.get("a") is False
+
+
+def test_hash_key():
+    assert serverCache.hash_key("token") != "token"
+    assert serverCache.hash_key("token") == serverCache.hash_key("token")
+
+
+def test_redis_cache():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    cache = serverCache.RedisCache(client, "shared", 60)
+    other = serverCache.RedisCache(client, "shared", 60)
+    cache.set(("Service 1", "prod-service-1"), [{"serviceName": "api"}])
+    cache.set("user", False)
+    assert other.get(("Service 1", "prod-service-1")) == [{"serviceName": "api"}]
+    assert other.get("user") is False
+    assert "missing" not in other
+    cache.set("expired", 1, ttl=-1)
+    assert cache.get("expired") is None
+    assert len(other) == 2
+    other.clear()
+    assert len(cache) == 0
+
+
+def test_single_flight():
+    flights = serverCache.SingleFlight(timeout=5)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        if value == "boom":
+            raise ValueError(value)
+        return [value]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flights.do, ("op", "a"), slow, "a")
+        started.wait(5)
+        followers = [pool.submit(flights.do, ("op", "a"), slow, "a") for _ in range(3)]
+        other = pool.submit(flights.do, ("op", "b"), slow, "b")
+        time.sleep(0.05)
+        release.set()
+        assert leader.result() == ["a"]
+        assert all(follower.result() is leader.result() for follower in followers)
+        assert other.result() == ["b"]
+    assert sorted(calls) == ["a", "b"]
+    assert len(flights) == 0
+
+
+def test_single_flight_errors_and_timeout():
+    flights = serverCache.SingleFlight(timeout=5)
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(flights.do, ("op",), fail)
+        time.sleep(0.05)
+        follower = pool.submit(flights.do, ("op",), fail)
+        impatient = pool.submit(flights.do, ("op",), fail, timeout=0.01)
+        with pytest.raises(TimeoutError):
+            impatient.result()
+        release.set()
+        with pytest.raises(ValueError):
+            leader.result()
+        with pytest.raises(ValueError):
+            follower.result()
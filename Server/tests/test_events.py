@@ -0,0 +1,117 @@
+import json
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+import serverCache
+import serverEvents
+
+CLUSTER_ARN = "arn:aws:ecs:eu-west-1:123456789012:cluster/uat-srv2"
+KEY = ("Service 2", "uat-srv2")
+
+
+def task_event(task_id, desired, last, version, service="api"):
+    return {"id": "event-" + task_id + "-" + str(version), "detail-type": serverEvents.TASK_STATE_CHANGE, "detail": {
+        "clusterArn": CLUSTER_ARN, "taskArn": "arn:aws:ecs:eu-west-1:123456789012:task/uat-srv2/" + task_id,
+        "group": "service:" + service, "desiredStatus": desired, "lastStatus": last, "version": version,
+        "containerInstanceArn": "instance-1",
+        "containers": [{"containerArn": "container-" + task_id, "name": "app", "runtimeId": "runtime-" + task_id, "lastStatus": last}]
+    }}
+
+
+@pytest.fixture
+def caches(server, monkeypatch):
+    for name in ("services_cache", "instances_cache", "tasks_cache", "task_cache", "generations"):
+        monkeypatch.setattr(server, name, serverCache.TTLCache(100, 60))
+    return server
+
+
+def test_task_events(caches):
+    server = caches
+    arn = "arn:aws:ecs:eu-west-1:123456789012:task/uat-srv2/"
+    server.tasks_cache.set(KEY + ("api",), [arn + "t1"])
+    server.services_cache.set(KEY, [{"serviceName": "api", "runningCount": 1}])
+
+    server.apply_event(task_event("t2", "RUNNING", "PENDING", 1))
+    assert server.tasks_cache.get(KEY + ("api",)) == [arn + "t1", arn + "t2"]
+    assert KEY in server.services_cache
+
+    server.apply_event(task_event("t2", "RUNNING", "RUNNING", 2))
+    assert KEY not in server.services_cache
+    assert server.describe_task("Service 2", "uat-srv2", None, arn + "t2")["containers"][0]["runtimeId"] == "runtime-t2"
+
+    server.apply_event(task_event("t1", "STOPPED", "RUNNING", 3))
+    assert server.tasks_cache.get(KEY + ("api",)) == [arn + "t2"]
+
+    # Late event, older than the one already applied
+    server.apply_event(task_event("t2", "RUNNING", "PENDING", 1))
+    assert server.task_cache.get(KEY + ("t2",))["lastStatus"] == "RUNNING"
+
+    # Other region, not the cluster of the menu
+    event = task_event("t3", "RUNNING", "RUNNING", 1)
+    event["detail"]["clusterArn"] = CLUSTER_ARN.replace("eu-west-1", "us-east-1")
+    server.apply_event(event)
+    assert server.tasks_cache.get(KEY + ("api",)) == [arn + "t2"]
+
+
+def test_event_during_a_fill(caches, monkeypatch):
+    # The tasks listed before the event must not replace it in the cache
+    server = caches
+    arn = "arn:aws:ecs:eu-west-1:123456789012:task/uat-srv2/"
+
+    def list_service_tasks(client, cluster, service_name):
+        server.apply_event(task_event("t2", "RUNNING", "PENDING", 1))
+        return [arn + "t1"]
+
+    monkeypatch.setattr(server, "list_service_tasks", list_service_tasks)
+    assert server.service_tasks("Service 2", "uat-srv2", None, "api") == [arn + "t1"]
+    assert KEY + ("api",) not in server.tasks_cache
+
+    monkeypatch.setattr(server, "list_service_tasks", lambda client, cluster, service_name: [arn + "t1", arn + "t2"])
+    server.service_tasks("Service 2", "uat-srv2", None, "api")
+    assert server.tasks_cache.get(KEY + ("api",)) == [arn + "t1", arn + "t2"]
+
+
+def test_instance_events(caches):
+    server = caches
+    server.instances_cache.set(KEY, {"instance-1": "10.0.0.1", "instance-2": "10.0.0.2"})
+    event = {"detail-type": serverEvents.INSTANCE_STATE_CHANGE,
+             "detail": {"clusterArn": CLUSTER_ARN, "containerInstanceArn": "instance-1", "status": "DRAINING"}}
+    server.apply_event(event)
+    assert server.instances_cache.get(KEY) == {"instance-1": "10.0.0.1", "instance-2": "10.0.0.2"}
+    event["detail"]["status"] = "INACTIVE"
+    server.apply_event(event)
+    assert server.instances_cache.get(KEY) == {"instance-2": "10.0.0.2"}
+
+
+def test_file_source(caches, tmp_path):
+    server = caches
+    path = tmp_path / "events.jsonl"
+    consumer = serverEvents.EventConsumer(serverEvents.FileEventSource(str(path), wait=0), server.apply_event)
+    assert consumer.poll() == 0
+    with open(path, "w") as fp:
+        fp.write(json.dumps(task_event("t1", "RUNNING", "RUNNING", 1)) + "\n")
+        fp.write(json.dumps({"detail-type": "Something else", "detail": {}}) + "\n")
+        fp.write(json.dumps(task_event("t2", "RUNNING", "RUNNING", 1))[:20])
+    assert consumer.poll() == 2
+    assert KEY + ("t1",) in server.task_cache
+    with open(path, "a") as fp:
+        fp.write(json.dumps(task_event("t2", "RUNNING", "RUNNING", 1))[20:] + "\n")
+    assert consumer.poll() == 1
+    assert KEY + ("t2",) in server.task_cache
+
+
+def test_sqs_source(caches):
+    server = caches
+    client = boto3.client('sqs', region_name='eu-west-1')
+    queue_url = "https://sqs.eu-west-1.amazonaws.com/123456789012/ssh-ecs-events"
+    consumer = serverEvents.EventConsumer(serverEvents.SqsEventSource(client, queue_url), server.apply_event)
+    with Stubber(client) as stubber:
+        stubber.add_response('receive_message', {"Messages": [
+            {"MessageId": "1", "ReceiptHandle": "handle-1", "Body": json.dumps(task_event("t1", "RUNNING", "RUNNING", 1))}
+        ]}, {"QueueUrl": queue_url, "MaxNumberOfMessages": 10, "WaitTimeSeconds": 20})
+        stubber.add_response('delete_message', {}, {"QueueUrl": queue_url, "ReceiptHandle": "handle-1"})
+        assert consumer.poll() == 1
+        stubber.assert_no_pending_responses()
+    assert KEY + ("t1",) in server.task_cache
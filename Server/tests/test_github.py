@@ -0,0 +1,61 @@
+import pytest
+from prometheus_client import REGISTRY
+
+import serverCache
+import serverGithub
+from fakes import StubServer, github_handler
+
+
+@pytest.fixture
+def github():
+    handle = github_handler("My-Org", {"alice-token": "alice", "admin-token": "admin"}, {"devops": ["alice"]}, limit=1000)
+    state = {"down": False}
+
+    def maybe_down(method, path, headers, body):
+        if state["down"]:
+            return "down", 502, {"message": "Server Error"}
+        return handle(method, path, headers, body)
+    stub = StubServer(maybe_down)
+    stub.state = state
+    yield stub
+    stub.close()
+
+
+def client(stub, **kwargs):
+    return serverGithub.GithubClient(stub.url, "My-Org", "admin-token", cache=serverCache.TTLCache(100, 60), **kwargs)
+
+
+def test_conditional_requests(github):
+    api = client(github)
+    assert api.user("alice-token")["login"] == "alice"
+    assert api.budget("alice-token") == 999
+    response = api.get("user", "/user", "alice-token")
+    assert response.cached and response.data["login"] == "alice"
+    # 304 are free
+    assert api.budget("alice-token") == 999
+    assert github.calls["user"] == 2
+    assert api.user("bad-token") is None
+    assert api.is_team_member("devops", "alice")
+    assert not api.is_team_member("devops", "bob")
+    assert api.team_members("devops") == {"alice"}
+    assert REGISTRY.get_sample_value("sshecs_github_ratelimit_remaining") == 997
+
+
+def test_low_budget_uses_cache(github):
+    api = client(github, low_budget=999)
+    assert api.is_org_member("alice")
+    assert api.is_org_member("alice")
+    assert github.calls["org-member"] == 1
+    # Nothing in the cache, github is still asked
+    assert not api.is_org_member("bob")
+    assert github.calls["org-member"] == 2
+
+
+def test_github_down_uses_cache(github):
+    api = client(github)
+    assert api.is_team_member("devops", "alice")
+    github.state["down"] = True
+    assert api.is_team_member("devops", "alice")
+    assert not api.is_team_member("devops", "bob")
+    assert github.calls["down"] == 2
+    assert REGISTRY.get_sample_value("sshecs_github_degraded_total", {"operation": "team-membership"}) >= 1
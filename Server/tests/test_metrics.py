@@ -0,0 +1,50 @@
+import pytest
+from prometheus_client import REGISTRY
+
+import serverCache
+import serverMetrics
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_upstream_errors():
+    labels = {"dependency": "test", "operation": "call"}
+    with serverMetrics.upstream("test", "call") as call:
+        call.check(Response(404))
+    with serverMetrics.upstream("test", "call") as call:
+        call.check(Response(503))
+    with pytest.raises(ValueError):
+        with serverMetrics.upstream("test", "call"):
+            raise ValueError()
+    assert sample("sshecs_upstream_duration_seconds_count", **labels) == 3
+    assert sample("sshecs_upstream_errors_total", **labels) == 2
+
+
+def test_cache_hits():
+    cache = serverCache.TTLCache(10, 60, name="test")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert "b" not in cache
+    assert sample("sshecs_cache_hits_total", cache="test") == 1
+    assert sample("sshecs_cache_misses_total", cache="test") == 1
+
+
+def test_metrics_route(server, monkeypatch):
+    client = server.app.test_client()
+    client.get('/health')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain')
+    assert b'sshecs_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.data
+    assert b'sshecs_temp_requests_pending' in response.data
+    monkeypatch.setattr(server.serverSettings, "METRICS_TOKEN", "secret")
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={"Authorization": "Bearer secret"}).status_code == 200
@@ -0,0 +1,119 @@
+import serverCache
+
+
+def test_gzip_big_answers(server, monkeypatch):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    monkeypatch.setattr(server, "get_services", lambda app, cluster, client: [{"serviceName": "svc-%d" % i} for i in range(100)])
+    client = server.app.test_client()
+    response = client.get('/services/Service 1/prod-service-1', headers={"Authorization": "Bearer token", "Accept-Encoding": "gzip"})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    response = client.get('/services/Service 1/prod-service-1', headers={"Authorization": "Bearer token"})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_json()) == 100
+
+
+def test_services_max_age(server, monkeypatch):
+    # The server cache can be long with the ecs events, the clients must still ask again soon
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    monkeypatch.setattr(server, "get_services", lambda app, cluster, client: [])
+    monkeypatch.setattr(server.serverSettings, "SERVICES_CACHE_TTL", 3600)
+    response = server.app.test_client().get('/services/Service 1/prod-service-1', headers={"Authorization": "Bearer token"})
+    assert response.cache_control.max_age == server.serverSettings.SERVICES_MAX_AGE
+
+
+def test_conditional_menu(server):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    client = server.app.test_client()
+    response = client.get('/menu', headers={"Authorization": "Bearer token"})
+    etag = response.headers['ETag']
+    assert response.get_json() == server.serverSettings.MENU
+    assert 'max-age=' in response.headers['Cache-Control']
+    response = client.get('/menu', headers={"Authorization": "Bearer token", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers['Ssh-Tool-Version'] == str(server.serverSettings.VERSION)
+
+
+def test_match_names(server):
+    names = ["api", "api-worker", "front"]
+    assert server.match_names("api", names) == ["api"]
+    assert server.match_names("api.*", names) == ["api", "api-worker"]
+    assert server.match_names("WORK", names) == ["api-worker"]
+    assert server.match_names("[", names) == []
+
+
+def test_resolve(server, monkeypatch):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    task = {
+        "taskArn": "arn:aws:ecs:eu-west-1:1:task/cluster/abc123",
+        "containerInstanceArn": "instance",
+        "containers": [{"name": "app", "runtimeId": "runtime-app"}, {"name": "datadog", "runtimeId": "runtime-dd"}]
+    }
+    monkeypatch.setattr(server, "verify_access", lambda app, cluster, username: True)
+    monkeypatch.setattr(server, "get_services", lambda app, cluster, client: [{"serviceName": "api"}, {"serviceName": "api-worker"}])
+    monkeypatch.setattr(server, "list_service_tasks", lambda client, cluster, service: [task["taskArn"]])
+    monkeypatch.setattr(server, "describe_tasks", lambda client, cluster, arns: [task])
+    monkeypatch.setattr(server, "get_instance_ip", lambda app, cluster, client, client_ec2, arn: "10.0.0.1")
+    monkeypatch.setattr(server.vault, "issue_otp", lambda ip: "otp")
+    client = server.app.test_client()
+
+    def resolve(**payload):
+        return client.post('/resolve/Service 1/prod-service-1', json=payload, headers={"Authorization": "Bearer token"}).get_json()
+
+    assert resolve(service="api", container="app") == {
+        "ip": "10.0.0.1", "container": "runtime-app", "OTP": "otp",
+        "service": "api", "task": task["taskArn"], "containerName": "app"
+    }
+    assert resolve(service="api", container="app", masters=["10.0.0.1"])["OTP"] == ""
+    assert resolve(service="api.*")["error"] == "Ambiguous"
+    assert resolve(service="api")["candidates"] == ["app", "datadog"]
+    assert resolve(service="api", task="zzz")["error"] == "Not_Found"
+
+
+def test_resolve_skips_fargate_tasks(server, monkeypatch):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    tasks = [{"taskArn": "arn:aws:ecs:eu-west-1:1:task/cluster/fargate", "containers": [{"name": "app", "runtimeId": "runtime-f"}]},
+             {"taskArn": "arn:aws:ecs:eu-west-1:1:task/cluster/ec2", "containerInstanceArn": "instance",
+              "containers": [{"name": "app", "runtimeId": "runtime-e"}]}]
+    monkeypatch.setattr(server, "verify_access", lambda app, cluster, username: True)
+    monkeypatch.setattr(server, "get_services", lambda app, cluster, client: [{"serviceName": "api"}])
+    monkeypatch.setattr(server, "list_service_tasks", lambda client, cluster, service: [t["taskArn"] for t in tasks])
+    monkeypatch.setattr(server, "describe_tasks", lambda client, cluster, arns: tasks)
+    monkeypatch.setattr(server, "get_instance_ip", lambda app, cluster, client, client_ec2, arn: "10.0.0.1")
+    monkeypatch.setattr(server.vault, "issue_otp", lambda ip: "otp")
+    client = server.app.test_client()
+
+    def resolve(**payload):
+        return client.post('/resolve/Service 1/prod-service-1', json=payload, headers={"Authorization": "Bearer token"})
+
+    response = resolve(service="api")
+    assert response.status_code == 200
+    assert response.get_json()["container"] == "runtime-e"
+    assert resolve(service="api", task="fargate").get_json() == {"error": "Not_Found", "level": "task", "candidates": ["ec2"]}
+
+
+def test_exec(server, monkeypatch):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    tasks = [{
+        "taskArn": "arn:aws:ecs:eu-west-1:1:task/cluster/task%d" % i,
+        "containerInstanceArn": "instance",
+        "containers": [{"name": "app", "runtimeId": "runtime-%d" % i}, {"name": "datadog", "runtimeId": "dd-%d" % i}]
+    } for i in range(3)]
+    # On fargate, not connectable
+    tasks.append({"taskArn": "arn:aws:ecs:eu-west-1:1:task/cluster/fargate", "containers": [{"name": "app", "runtimeId": "runtime-f"}]})
+    monkeypatch.setattr(server, "verify_access", lambda app, cluster, username: True)
+    monkeypatch.setattr(server, "get_services", lambda app, cluster, client: [{"serviceName": "api"}])
+    monkeypatch.setattr(server, "list_service_tasks", lambda client, cluster, service: [t["taskArn"] for t in tasks])
+    monkeypatch.setattr(server, "describe_tasks", lambda client, cluster, arns: tasks)
+    monkeypatch.setattr(server, "get_instance_ip", lambda app, cluster, client, client_ec2, arn: "10.0.0.1")
+    otps = iter(range(10))
+    monkeypatch.setattr(server.vault, "issue_otps", lambda ips: ["otp-%d" % next(otps) for ip in ips])
+    client = server.app.test_client()
+
+    def execute(**payload):
+        return client.post('/exec/Service 1/prod-service-1', json=payload, headers={"Authorization": "Bearer token"}).get_json()
+
+    result = execute(service="api", container="app")
+    assert [t["container"] for t in result["tasks"]] == ["runtime-0", "runtime-1", "runtime-2"]
+    assert len(set(t["OTP"] for t in result["tasks"])) == 3
+    assert execute(service="api")["error"] == "Ambiguous"
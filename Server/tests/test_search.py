@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import serverCache
+import serverSearch
+
+
+def entry(app, cluster, service, name="app", image="registry/app:1", ips=("10.0.0.1",)):
+    return {"app": app, "cluster": cluster, "service": service, "task": "arn:aws:ecs:eu-west-1:1:task/" + cluster + "/t-" + service,
+            "container": "container-arn - " + name, "containerName": name, "image": image, "ips": list(ips)}
+
+
+def test_match_entry():
+    container = entry("Service 2", "uat-srv2", "billing-api", name="datadog", image="datadog/agent:7", ips=("10.0.3.12",))
+    assert serverSearch.match_entry("BILLING", container) == "service"
+    assert serverSearch.match_entry("datadog", container) == "container"
+    assert serverSearch.match_entry("agent:7", container) == "image"
+    assert serverSearch.match_entry("10.0.3.", container) == "ip"
+    assert serverSearch.match_entry("10.0.3.1", container) == "ip"
+    assert serverSearch.match_entry("front", container) is None
+
+
+def test_search_route(server, monkeypatch):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    built = []
+
+    def build(app, cluster):
+        built.append(cluster)
+        if cluster == "pp-srv2":
+            raise RuntimeError("throttled")
+        return [entry(app, cluster, "billing-api"), entry(app, cluster, "front", image="registry/billing-front:2")]
+
+    monkeypatch.setattr(server.search_index, "build", build)
+    monkeypatch.setattr(server.search_index, "_clusters", {})
+    monkeypatch.setattr(server, "verify_access", lambda app, cluster, username: cluster != "prod-srv2")
+    client = server.app.test_client()
+
+    answer = client.get('/search?q=billing', headers={"Authorization": "Bearer token"}).get_json()
+    assert answer["errors"] == ["Service 2/pp-srv2"]
+    assert [(r["cluster"], r["service"], r["matched"]) for r in answer["results"]] == [
+        ("prod-service-1", "billing-api", "service"), ("prod-service-1", "front", "image"),
+        ("uat-srv2", "billing-api", "service"), ("uat-srv2", "front", "image")
+    ]
+    assert answer["results"][0]["target"] == "Service 1/prod-service-1/billing-api/t-billing-api/app"
+    assert "prod-srv2" not in built
+
+    # Indexed clusters are not built again
+    built.clear()
+    client.get('/search?q=front', headers={"Authorization": "Bearer token"})
+    assert built == ["pp-srv2"]
+    assert client.get('/search', headers={"Authorization": "Bearer token"}).get_json() == {"error": "missig arg"}
+
+
+def test_search_with_github_checks(server, monkeypatch):
+    # Without the team index every cluster asks github, with more searches than threads in the upstream pool
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    monkeypatch.setattr(server, "upstream_pool", ThreadPoolExecutor(max_workers=2))
+    monkeypatch.setattr(server.team_index, "is_member", lambda team, username: None)
+    monkeypatch.setattr(server.github, "is_team_member", lambda team, username: team == "devops")
+    monkeypatch.setattr(server.search_index, "build", lambda app, cluster: [entry(app, cluster, "billing-api")])
+    monkeypatch.setattr(server.search_index, "_clusters", {})
+
+    def search(_):
+        return server.app.test_client().get('/search?q=billing', headers={"Authorization": "Bearer token"}).get_json()
+
+    # Not waited for on exit, a deadlock fails the test instead of hanging it
+    clients = ThreadPoolExecutor(max_workers=6)
+    futures = [clients.submit(search, i) for i in range(6)]
+    clients.shutdown(wait=False)
+    answers = [future.result(timeout=10) for future in futures]
+    assert all(len(answer["results"]) == len(serverSearch.all_clusters()) for answer in answers)
+
+
+@pytest.mark.parametrize("max_age, rebuilt", [(900, False), (-1, True)])
+def test_index_refresh(max_age, rebuilt):
+    calls = []
+    index = serverSearch.SearchIndex(lambda app, cluster: calls.append(cluster) or [], max_age=max_age)
+    index.refresh()
+    assert len(calls) == len(serverSearch.all_clusters())
+    index.entries("Service 1", "prod-service-1")
+    assert (len(calls) > len(serverSearch.all_clusters())) == rebuilt
+
+
+def test_index_builds_a_cluster_once():
+    calls = []
+
+    def build(app, cluster):
+        calls.append(cluster)
+        time.sleep(0.2)
+        return [entry(app, cluster, "billing-api")]
+
+    index = serverSearch.SearchIndex(build, flights=serverCache.SingleFlight())
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: index.entries("Service 1", "prod-service-1"), range(4)))
+    assert calls == ["prod-service-1"]
+    assert all(len(result) == 1 for result in results)
@@ -0,0 +1,98 @@
+import boto3
+from botocore.stub import Stubber
+
+
+def service(name):
+    return {
+        "serviceArn": "arn:aws:ecs:eu-west-1:1:service/cluster/" + name,
+        "serviceName": name,
+        "status": "ACTIVE",
+        "runningCount": 1,
+        "desiredCount": 2,
+        "pendingCount": 1
+    }
+
+
+def test_list_services_paginates_and_batches(server):
+    client = boto3.client('ecs', region_name='eu-west-1')
+    names = ["svc-%02d" % i for i in range(15)]
+    arns = [service(name)["serviceArn"] for name in names]
+    with Stubber(client) as stubber:
+        stubber.add_response('list_services', {"serviceArns": arns[:12], "nextToken": "next"},
+                             {"cluster": "cluster", "maxResults": 100})
+        stubber.add_response('list_services', {"serviceArns": arns[12:]},
+                             {"cluster": "cluster", "maxResults": 100, "nextToken": "next"})
+        stubber.add_response('describe_services', {"services": [service(name) for name in names[:10]]},
+                             {"cluster": "cluster", "services": arns[:10]})
+        stubber.add_response('describe_services', {"services": [service(name) for name in names[10:]]},
+                             {"cluster": "cluster", "services": arns[10:]})
+        services = server.list_services(client, "cluster")
+        stubber.assert_no_pending_responses()
+    assert [s["serviceName"] for s in services] == names
+    assert services[0]["runningCount"] == 1
+    assert services[0]["desiredCount"] == 2
+
+
+def task(service_name, task_id):
+    return {
+        "taskArn": "arn:aws:ecs:eu-west-1:1:task/cluster/" + task_id,
+        "group": "service:" + service_name,
+        "lastStatus": "RUNNING",
+        "containers": [{"containerArn": "arn:aws:ecs:eu-west-1:1:container/" + task_id, "name": "app"}]
+    }
+
+
+def test_build_topology(server):
+    client = boto3.client('ecs', region_name='eu-west-1')
+    tasks = [task("svc-a", "t%03d" % i) for i in range(150)] + [task("svc-b", "t150")]
+    arns = [t["taskArn"] for t in tasks]
+    with Stubber(client) as stubber:
+        stubber.add_response('list_tasks', {"taskArns": arns[:100], "nextToken": "next"},
+                             {"cluster": "cluster", "desiredStatus": "RUNNING", "maxResults": 100})
+        stubber.add_response('list_tasks', {"taskArns": arns[100:]},
+                             {"cluster": "cluster", "desiredStatus": "RUNNING", "maxResults": 100, "nextToken": "next"})
+        stubber.add_response('describe_tasks', {"tasks": tasks[:100]}, {"cluster": "cluster", "tasks": arns[:100]})
+        stubber.add_response('describe_tasks', {"tasks": tasks[100:]}, {"cluster": "cluster", "tasks": arns[100:]})
+        topology = server.build_topology(client, "cluster", [service("svc-a"), service("svc-b"), service("svc-c")])
+        stubber.assert_no_pending_responses()
+    assert [len(s["tasks"]) for s in topology] == [150, 1, 0]
+    assert topology[1]["tasks"][0]["containers"] == ["arn:aws:ecs:eu-west-1:1:container/t150 - app"]
+
+
+def test_instance_ip_cache(server):
+    client = boto3.client('ecs', region_name='eu-west-1')
+    client_ec2 = boto3.client('ec2', region_name='eu-west-1')
+    arn = "arn:aws:ecs:eu-west-1:1:container-instance/cluster/abc"
+    instance = {"InstanceId": "i-1", "NetworkInterfaces": [{"PrivateIpAddress": "10.0.0.1"}]}
+    server.instances_cache.clear()
+    with Stubber(client) as stubber, Stubber(client_ec2) as stubber_ec2:
+        stubber.add_response('list_container_instances', {"containerInstanceArns": [arn]},
+                             {"cluster": "cluster", "maxResults": 100})
+        stubber.add_response('describe_container_instances',
+                             {"containerInstances": [{"containerInstanceArn": arn, "ec2InstanceId": "i-1"}]},
+                             {"cluster": "cluster", "containerInstances": [arn]})
+        stubber_ec2.add_response('describe_instances', {"Reservations": [{"Instances": [instance]}]},
+                                 {"InstanceIds": ["i-1"]})
+        assert server.get_instance_ip("app", "cluster", client, client_ec2, arn) == "10.0.0.1"
+        # Second lookup is served from the cache, the stubbers would fail on an extra call
+        assert server.get_instance_ip("app", "cluster", client, client_ec2, arn) == "10.0.0.1"
+        stubber.assert_no_pending_responses()
+
+
+def test_instance_ips_skip_terminated_instances(server):
+    # A spot instance interrupted but still ACTIVE in ecs has no network interface anymore
+    client = boto3.client('ecs', region_name='eu-west-1')
+    client_ec2 = boto3.client('ec2', region_name='eu-west-1')
+    arns = ["arn:aws:ecs:eu-west-1:1:container-instance/cluster/" + name for name in ("abc", "def")]
+    instances = [{"InstanceId": "i-1", "NetworkInterfaces": [{"PrivateIpAddress": "10.0.0.1"}]},
+                 {"InstanceId": "i-2", "NetworkInterfaces": []}]
+    with Stubber(client) as stubber, Stubber(client_ec2) as stubber_ec2:
+        stubber.add_response('list_container_instances', {"containerInstanceArns": arns},
+                             {"cluster": "cluster", "maxResults": 100})
+        stubber.add_response('describe_container_instances',
+                             {"containerInstances": [{"containerInstanceArn": arns[0], "ec2InstanceId": "i-1"},
+                                                     {"containerInstanceArn": arns[1], "ec2InstanceId": "i-2"}]},
+                             {"cluster": "cluster", "containerInstances": arns})
+        stubber_ec2.add_response('describe_instances', {"Reservations": [{"Instances": instances}]},
+                                 {"InstanceIds": ["i-1", "i-2"]})
+        assert server.list_instance_ips(client, client_ec2, "cluster") == {arns[0]: "10.0.0.1"}
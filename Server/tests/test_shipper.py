@@ -0,0 +1,59 @@
+import requests
+
+import serverShipper
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.posts = list()
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append((url, json))
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status is None:
+            raise requests.exceptions.ConnectionError()
+        return FakeResponse(status)
+
+
+def test_logs_are_batched():
+    session = FakeSession()
+    shipper = serverShipper.Shipper(session=session)
+    for i in range(3):
+        shipper.queue.put({"url": "http://datadog", "payload": {"message": i}, "batch": True})
+    shipper.queue.put({"url": "http://slack", "payload": {"text": "hello"}, "batch": False})
+    shipper.start()
+    shipper.flush()
+    assert ("http://datadog", [{"message": 0}, {"message": 1}, {"message": 2}]) in session.posts
+    assert ("http://slack", {"text": "hello"}) in session.posts
+    assert len(session.posts) == 2
+
+
+def test_retry_with_backoff():
+    session = FakeSession([None, 503, 200])
+    shipper = serverShipper.Shipper(session=session)
+    shipper.backoff = 0
+    assert shipper._post("http://slack", {"text": "hello"})
+    assert len(session.posts) == 3
+    assert not serverShipper.Shipper(session=FakeSession([500] * 5), retries=0)._post("http://slack", {})
+
+
+def test_spill_when_full(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    shipper = serverShipper.Shipper(maxsize=1, full_policy="spill", spill_path=str(spill), session=FakeSession())
+    shipper.queue.put({"url": "http://slack", "payload": {}, "batch": False})
+    shipper._thread = type("Running", (), {"is_alive": lambda self: True})()
+    shipper.send("http://slack", {"text": "spilled"})
+    assert "spilled" in spill.read_text()
+
+    session = FakeSession()
+    shipper = serverShipper.Shipper(full_policy="spill", spill_path=str(spill), session=session)
+    shipper.start()
+    shipper.flush()
+    assert session.posts == [("http://slack", {"text": "spilled"})]
+    assert not spill.exists()
@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+
+import pytest
+
+import serverStore
+
+
+def request(i):
+    return {'name': 'alice', 'app': 'Service 1', 'cluster': 'prod-service-1', 'task': 't', 'container': 'c',
+            'uuidValidator': 'validator-%d' % i, 'uuidRequester': 'requester-%d' % i}
+
+
+def test_sqlite_store(tmp_path):
+    store = serverStore.open_store("sqlite", str(tmp_path / "requests.db"), 60)
+    store.add(request(1))
+    assert store.get_by_requester('requester-1')['valid'] is False
+    assert store.get_by_requester('validator-1') is None
+    assert store.count_waiting() == 1
+    assert store.validate('validator-1')['uuidRequester'] == 'requester-1'
+    assert store.get_by_requester('requester-1')['valid'] is True
+    assert store.count_waiting() == 0
+    assert store.validate('requester-1') is None
+
+
+def test_sqlite_store_expiry(tmp_path):
+    store = serverStore.open_store("sqlite", str(tmp_path / "requests.db"), 60)
+    store.add(dict(request(1), created=time.time() - 120))
+    store.add(request(2))
+    assert store.get_by_requester('requester-1') is None
+    store.compact()
+    count = store._connection().execute('SELECT COUNT(*) FROM requests').fetchone()[0]
+    assert count == 1
+
+
+def test_import_tinydb(tmp_path):
+    db = tmp_path / "db.json"
+    db.write_text(json.dumps({"_default": {"1": dict(request(1), valid=True), "2": dict(request(2), valid=False)}}))
+    store = serverStore.open_store("sqlite", str(tmp_path / "requests.db"), 60)
+    assert store.import_tinydb(str(db)) == 2
+    assert not db.exists()
+    assert store.get_by_requester('requester-1')['valid'] is True
+    assert store.get_by_requester('requester-2')['valid'] is False
+
+
+def test_redis_store_replicas():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    first = serverStore.RedisRequestStore(fakeredis.FakeRedis(server=server), 60)
+    second = serverStore.RedisRequestStore(fakeredis.FakeRedis(server=server), 60)
+    validated = threading.Event()
+    first.listen(lambda uuidRequester: uuidRequester == 'requester-1' and validated.set())
+    first.add(request(1))
+    first.add(dict(request(2), created=time.time() - 120))
+    assert second.get_by_requester('requester-1')['valid'] is False
+    assert second.get_by_requester('requester-2') is None
+    assert second.count_waiting() == 1
+    assert second.validate('validator-1')['uuidRequester'] == 'requester-1'
+    assert first.get_by_requester('requester-1')['valid'] is True
+    assert first.count_waiting() == 0
+    assert second.validate('unknown') is None
+    assert validated.wait(5)
+
+
+def test_store_interface():
+    with pytest.raises(TypeError):
+        serverStore.RequestStore()
@@ -0,0 +1,31 @@
+import serverTeams
+
+
+def test_index_lookup():
+    index = serverTeams.TeamIndex(fetch=lambda team: {"alice"} if team == "devops" else set())
+    assert index.is_member("devops", "Alice") is None
+    index.refresh()
+    assert index.is_member("devops", "Alice") is True
+    assert index.is_member("srv2-dev", "alice") is False
+    assert index.is_member("unknown-team", "alice") is None
+
+
+def test_stale_index():
+    index = serverTeams.TeamIndex(max_age=-1, fetch=lambda team: {"alice"})
+    index.refresh()
+    assert index.is_member("devops", "alice") is None
+
+
+def test_all_teams():
+    assert "devops" in serverTeams.all_teams()
+    assert "eu-west-1" not in serverTeams.all_teams()
+
+
+def test_index_sees_new_members():
+    members = {"devops": {"alice"}}
+    index = serverTeams.TeamIndex(fetch=lambda team: members.get(team, set()))
+    index.refresh()
+    assert index.is_member("devops", "bob") is False
+    members["devops"] = {"alice", "bob"}
+    index.refresh()
+    assert index.is_member("devops", "bob") is True
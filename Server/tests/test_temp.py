@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+from flask import jsonify
+
+import serverCache
+
+
+@pytest.fixture
+def api(server, monkeypatch):
+    server.auth_cache.set(serverCache.hash_key("token"), {"username": "alice", "id": 1})
+    monkeypatch.setattr(server, "getConnectDetail", lambda app, cluster, task, container: jsonify({"ip": "10.0.0.1"}))
+    client = server.app.test_client()
+    return lambda path: client.get(path, headers={"Authorization": "Bearer token"}).get_json()
+
+
+def test_checktemp_long_poll(server, api):
+    server.store.add({'name': 'alice', 'app': 'Service 1', 'cluster': 'prod-service-1', 'task': 't', 'container': 'c',
+                      'uuidValidator': 'validator-1', 'uuidRequester': 'requester-1'})
+    assert api('/checktemp/requester-1') == {"status": "waiting"}
+    assert api('/checktemp/unknown?wait=1') == {"status": "invalid"}
+
+    threading.Timer(0.2, lambda: server.wake_up('requester-1')).start()
+    start = time.monotonic()
+    assert api('/checktemp/requester-1?wait=5') == {"ip": "10.0.0.1"}
+    assert time.monotonic() - start < 2
+    assert server.approvals == {}
+
+
+def test_validatetemp_wakes_up_every_poll(server, api, monkeypatch):
+    # The validation goes through the store and its listeners, to the two polls of the same request
+    monkeypatch.setattr(server, "verify_access", lambda app, cluster, username: True)
+    server.store.add({'name': 'alice', 'app': 'Service 1', 'cluster': 'prod-service-1', 'task': 't', 'container': 'c',
+                      'uuidValidator': 'validator-2', 'uuidRequester': 'requester-2'})
+    answers = []
+    polls = [threading.Thread(target=lambda: api('/checktemp/requester-2?wait=0.1')),
+             threading.Thread(target=lambda: answers.append(api('/checktemp/requester-2?wait=5')))]
+    start = time.monotonic()
+    for poll in polls:
+        poll.start()
+    # The short poll is over, the other one must still be woken up
+    polls[0].join()
+    time.sleep(0.1)
+    assert api('/validatetemp/validator-2') == {"status": "ok"}
+    polls[1].join(5)
+    assert answers == [{"ip": "10.0.0.1"}]
+    assert time.monotonic() - start < 2
+    assert server.approvals == {}
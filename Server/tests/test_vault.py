@@ -0,0 +1,32 @@
+import pytest
+
+import serverVault
+from fakes import StubServer, vault_handler
+
+
+@pytest.fixture
+def stub():
+    server = StubServer(vault_handler())
+    yield server
+    server.close()
+
+
+def test_issue_otp(stub):
+    vault = serverVault.VaultClient(stub.url, "vault-token", "ssh/creds/otp_key_role")
+    assert vault.check_health()
+    assert vault.issue_otp("10.0.0.1") == "otp-10.0.0.1"
+    assert vault.issue_otp("10.0.0.2") == "otp-10.0.0.2"
+    # Keep alive, every call went through the same connection
+    assert len(stub.connections) == 1
+
+
+def test_issue_otps_concurrently(stub):
+    vault = serverVault.VaultClient(stub.url, "vault-token", "ssh/creds/otp_key_role", pool_size=4)
+    ips = ["10.0.0.%d" % i for i in range(8)] + ["10.0.0.1"]
+    assert vault.issue_otps(ips) == ["otp-" + ip for ip in ips]
+    assert len(stub.requests) == 9
+
+
+def test_bad_token(stub):
+    vault = serverVault.VaultClient(stub.url, "wrong", "ssh/creds/otp_key_role")
+    assert not vault.check_health()